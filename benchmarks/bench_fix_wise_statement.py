@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for fix_wise_statement() on synthetic Wise statements.
+
+Usage:
+  python benchmarks/bench_fix_wise_statement.py [--entries 10,1000,100000] [--json]
+
+For every size a statement is generated (see synthetic.py) and fixed by the tree
+engine, with a per-stage breakdown (parse, fix pass and each fix handler, write),
+and by the streaming engine (parse, fix, write). Every run happens in a fresh process so the reported
+peak RSS belongs to that run alone. The "parallel" engine (entries fixed in one worker
+process per CPU) is not run by default; its peak RSS leaves out the workers.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fix_wise_camt053 as fixer  # noqa: E402
+from synthetic import write_statement  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def _timed_handlers(stages: dict[str, float]) -> dict[str, fixer.FixHandler]:
+    def wrap(name: str, handler: fixer.FixHandler) -> fixer.FixHandler:
+        def timed(elem, ctx):
+            start = time.perf_counter()
+            try:
+                return handler(elem, ctx)
+            finally:
+                stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+        return timed
+
+    return {name: wrap(f"  handler {name}", h) for name, h in fixer.FIX_HANDLERS.items()}
+
+def run_tree(input_path: Path, output_path: Path) -> dict:
+    handler_times: dict[str, float] = {}
+    fixer.FIX_HANDLERS = _timed_handlers(handler_times)
+    start = time.perf_counter()
+    stats = fixer.fix_wise_statement(input_path, output_path)
+    seconds = time.perf_counter() - start
+
+    stages = dict(stats.stages)
+    # Show the handler breakdown right below the fix stage.
+    ordered = {}
+    for stage, t in stages.items():
+        ordered[stage] = t
+        if stage == "fix":
+            ordered.update(handler_times)
+    return {"seconds": seconds, "stages": ordered, "peak_rss_mb": peak_rss_mb()}
+
+def run_streaming(input_path: Path, output_path: Path) -> dict:
+    start = time.perf_counter()
+    stats = fixer.fix_wise_statement_streaming(input_path, output_path)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "stages": stats.stages, "peak_rss_mb": peak_rss_mb()}
+
+def run_parallel(input_path: Path, output_path: Path) -> dict:
+    start = time.perf_counter()
+    stats = fixer.fix_wise_statement_parallel(input_path, output_path)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "stages": stats.stages, "peak_rss_mb": peak_rss_mb()}
+
+ENGINES = {"tree": run_tree, "stream": run_streaming, "parallel": run_parallel}
+
+def _run_isolated(engine: str, input_path: Path, output_path: Path) -> dict:
+    # Not a multiprocessing.Pool: its daemonic workers can't start the parallel engine's pool.
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+        return pool.submit(ENGINES[engine], input_path, output_path).result()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", default="10,1000,100000", help="Comma-separated statement sizes")
+    parser.add_argument("--currencies", default="EUR,USD", help="One <Stmt> per currency")
+    parser.add_argument("--engines", default="tree,stream", help="Engines to run: tree, stream, parallel")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON instead of a table")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for entries in (int(x) for x in args.entries.split(",")):
+            input_path = Path(tmp) / f"wise_{entries}.xml"
+            with open(input_path, "w", encoding="utf-8") as out:
+                write_statement(out, entries, tuple(args.currencies.split(",")))
+            size_mb = os.path.getsize(input_path) / (1024 * 1024)
+
+            for engine in args.engines.split(","):
+                result = _run_isolated(engine, input_path, Path(tmp) / "out.xml")
+                result.update(
+                    engine=engine,
+                    entries=entries,
+                    input_mb=round(size_mb, 2),
+                    entries_per_sec=entries / result["seconds"] if result["seconds"] else None,
+                )
+                results.append(result)
+                if not args.json:
+                    _print_result(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0
+
+def _print_result(result: dict) -> None:
+    rss = result["peak_rss_mb"]
+    rss_text = f"{rss:.0f} MB" if rss is not None else "n/a"
+    print(
+        f"{result['engine']:>6} {result['entries']:>9} entries ({result['input_mb']:.1f} MB): "
+        f"{result['seconds']:8.3f}s  {result['entries_per_sec'] or 0:>10.0f} entries/s  "
+        f"peak RSS {rss_text}"
+    )
+    for stage, seconds in result["stages"].items():
+        print(f"{'':>8}{stage:<28} {seconds:8.3f}s")
+
+if __name__ == "__main__":
+    raise SystemExit(main())
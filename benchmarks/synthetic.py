@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic Wise camt.053.001.10 statements for benchmarking.
+
+Usage:
+  python benchmarks/synthetic.py 100000 statement.xml [--currencies EUR,USD,GBP]
+
+The generated entries mimic Wise exports: <Sts><Cd>BOOK</Cd></Sts>, <DtTm> booking
+dates, <AddtlNtryInf> card texts, a <TtlNtries> summary per statement and a mix of
+entries with and without NtryRef/AcctSvcrRef/NtryDtls. Output is written
+incrementally, so million-entry files don't need to fit in memory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TextIO
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fix_wise_camt053 import CAMT_10  # noqa: E402
+
+MERCHANTS = ("Tesco", "Uber *Trip", "Amazon Mktp", "Spotify", "Shell", "Booking.com", "Lidl & Co")
+
+def _entry(rng: random.Random, i: int, ccy: str, start: datetime) -> str:
+    booked = start + timedelta(minutes=17 * i)
+    amount = f"{rng.randint(100, 250_000) / 100:.2f}"
+    cdt = "CRDT" if rng.random() < 0.2 else "DBIT"
+    merchant = rng.choice(MERCHANTS)
+    parts = ["<Ntry>"]
+    if i % 3:
+        parts.append(f"<NtryRef>CARD-{i:09d}</NtryRef>")
+    parts.append(f'<Amt Ccy="{ccy}">{amount}</Amt><CdtDbtInd>{cdt}</CdtDbtInd>')
+    parts.append("<Sts><Cd>BOOK</Cd></Sts>")
+    parts.append(f"<BookgDt><DtTm>{booked:%Y-%m-%dT%H:%M:%S}.000Z</DtTm></BookgDt>")
+    parts.append(f"<ValDt><DtTm>{booked:%Y-%m-%dT%H:%M:%S}.000Z</DtTm></ValDt>")
+    if i % 5 == 0:
+        parts.append(f"<AcctSvcrRef>TRANSFER-{i}</AcctSvcrRef>")
+    parts.append("<BkTxCd><Prtry><Cd>CARD</Cd><Issr>Wise</Issr></Prtry></BkTxCd>")
+    if i % 2 == 0:
+        party = "Cdtr" if cdt == "DBIT" else "Dbtr"
+        parts.append(
+            "<NtryDtls><TxDtls>"
+            f"<Refs><EndToEndId>E2E-{i}</EndToEndId></Refs>"
+            f"<Amt Ccy=\"{ccy}\">{amount}</Amt>"
+            f"<RltdPties><{party}><Pty><Nm>{merchant.replace('&', '&amp;')}</Nm></Pty></{party}></RltdPties>"
+            "</TxDtls></NtryDtls>"
+        )
+    text = f"Card transaction of {amount} {ccy} issued by {merchant}"
+    parts.append(f"<AddtlNtryInf>{text.replace('&', '&amp;')}</AddtlNtryInf>")
+    parts.append("</Ntry>\n")
+    return "".join(parts)
+
+def write_statement(
+    out: TextIO,
+    entries: int,
+    currencies: tuple[str, ...] = ("EUR",),
+    seed: int = 0,
+) -> None:
+    """Write a statement with `entries` entries split evenly over one <Stmt> per currency."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 8, 0, 0)
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write(f'<Document xmlns="{CAMT_10}">\n<BkToCstmrStmt>\n')
+    out.write("<GrpHdr><MsgId>SYNTHETIC-1</MsgId><CreDtTm>2025-12-31T23:59:59</CreDtTm></GrpHdr>\n")
+    per_stmt, extra = divmod(entries, len(currencies))
+    first = 0
+    for n, ccy in enumerate(currencies):
+        count = per_stmt + (1 if n < extra else 0)
+        out.write(
+            f"<Stmt><Id>STMT-{ccy}</Id><CreDtTm>2025-12-31T23:59:59</CreDtTm>"
+            f"<FrToDt><FrDtTm>2025-01-01T00:00:00</FrDtTm><ToDtTm>2025-12-31T23:59:59</ToDtTm></FrToDt>"
+            f"<Acct><Id><IBAN>GB33WISE0000000{n:07d}</IBAN></Id><Ccy>{ccy}</Ccy></Acct>\n"
+        )
+        for code, date in (("OPBD", "2025-01-01"), ("CLBD", "2025-12-31")):
+            out.write(
+                f"<Bal><Tp><CdOrPrtry><Cd>{code}</Cd></CdOrPrtry></Tp><Amt Ccy=\"{ccy}\">1000.00</Amt>"
+                f"<CdtDbtInd>CRDT</CdtDbtInd><Dt><Dt>{date}</Dt></Dt></Bal>\n"
+            )
+        out.write(f"<TxsSummry><TtlNtries><NbOfNtries>{count}</NbOfNtries></TtlNtries></TxsSummry>\n")
+        for i in range(first, first + count):
+            out.write(_entry(rng, i, ccy, start))
+        first += count
+        out.write("</Stmt>\n")
+    out.write("</BkToCstmrStmt>\n</Document>\n")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic Wise camt.053.001.10 statement.")
+    parser.add_argument("entries", type=int, help="Number of <Ntry> elements")
+    parser.add_argument("output", type=Path, help="Output XML file")
+    parser.add_argument("--currencies", default="EUR", help="Comma-separated currencies, one <Stmt> each")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        write_statement(out, args.entries, tuple(args.currencies.split(",")), args.seed)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
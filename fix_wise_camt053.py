@@ -16,272 +16,3394 @@ Notes:
 from __future__ import annotations
 
 import argparse
+import asyncio
+import csv
+import ctypes
+import ctypes.util
+import fnmatch
+import glob
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import mmap
 import os
+import queue
 import re
+import select
+import shutil
+import struct
 import sys
+import threading
+import time
+import zipfile
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
 from copy import deepcopy
-from pathlib import Path
-from xml.etree import ElementTree as ET
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from itertools import chain, starmap
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Iterable, Iterator, NamedTuple, TextIO, Union
+from xml.sax.saxutils import escape
+
+# XML backend: lxml when it is installed (C-level serialization, getparent()),
+# otherwise the standard library. FIX_WISE_XML_BACKEND=etree forces the latter.
+try:
+    if os.environ.get("FIX_WISE_XML_BACKEND", "").lower() == "etree":
+        raise ImportError
+    from lxml import etree as ET
+    HAVE_LXML = True
+except ImportError:
+    from xml.etree import ElementTree as ET
+    HAVE_LXML = False
+
+__version__ = "0.2.0"
+
+# Bumped whenever a change alters the fixed output, so that ConversionCache entries
+# written by earlier builds are not served.
+OUTPUT_FORMAT = 3
 
 CAMT_10 = "urn:iso:std:iso:20022:tech:xsd:camt.053.001.10"
 CAMT_02 = "urn:iso:std:iso:20022:tech:xsd:camt.053.001.02"
 
+XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
+
+DATE_CONTAINERS = ("BookgDt", "ValDt")
+
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# AcctSvcrRef values made up for entries that have no reference of their own.
+SYNTHETIC_REF_PREFIX = "SYN-"
+
 def localname(tag: str) -> str:
     """Return local name of an XML tag (strip namespace)."""
     if tag.startswith("{"):
         return tag.split("}", 1)[1]
     return tag
 
+if HAVE_LXML:
+    # Per element rather than per backend: callers may pass xml.etree trees with lxml installed.
+    def find_child(elem: ET.Element, tag: str) -> ET.Element | None:
+        """First child of `elem` with the qualified `tag`, or None."""
+        # lxml's find() goes through its Python ElementPath; iterchildren() doesn't.
+        try:
+            children = elem.iterchildren(tag)
+        except AttributeError:  # an xml.etree element
+            return elem.find(tag)
+        for child in children:
+            return child
+        return None
+
+    def sub_element(parent: ET.Element, tag: str) -> ET.Element:
+        """ET.SubElement(parent, tag), for a parent of either backend."""
+        if isinstance(parent, ET._Element):
+            return ET.SubElement(parent, tag)
+        child = parent.makeelement(tag, {})
+        parent.append(child)
+        return child
+else:
+    find_child = ET.Element.find
+    sub_element = ET.SubElement
+
+def text_of(elem: ET.Element | None) -> str:
+    """Stripped text of `elem`; "" if it is missing or has no text."""
+    if elem is None or not elem.text:
+        return ""
+    return elem.text.strip()
+
+def collapse_whitespace(text: str) -> str:
+    """Strip `text` and turn every run of whitespace into a single space."""
+    # split()/join() does in one C pass what re.sub(r"\s+", " ", text.strip()) does in two.
+    return " ".join(text.split())
+
+class TagTable(dict):
+    """
+    Qualified tags of one namespace, built on first use: table["Sts"] -> "{ns}Sts".
+
+    The same handful of tags is looked up for every entry; the table hands out one
+    interned string per tag instead of formatting a new one each time.
+    """
+
+    def __init__(self, ns: str) -> None:
+        super().__init__()
+        self.ns = ns
+
+    def __missing__(self, name: str) -> str:
+        tag = self[name] = sys.intern(f"{{{self.ns}}}{name}")
+        return tag
+
+@lru_cache(maxsize=None)
+def tag_table(ns: str) -> TagTable:
+    return TagTable(ns)
+
 def qname(ns: str, name: str) -> str:
-    return f"{{{ns}}}{name}"
-
-def indent(elem: ET.Element, level: int = 0) -> None:
-    """In-place pretty indentation for ElementTree."""
-    i = "\n" + level * "  "
-    if len(elem):
-        if not (elem.text or "").strip():
-            elem.text = i + "  "
-        for child in elem:
-            indent(child, level + 1)
-        if not (elem.tail or "").strip():
-            elem.tail = i
-    else:
-        if level and not (elem.tail or "").strip():
-            elem.tail = i
+    return tag_table(ns)[name]
+
+class XmlWriter:
+    """
+    Incremental XML writer, pretty-printed (two-space indent) or compact.
+
+    Elements are written as they become final instead of serializing a whole tree
+    at once, and subtrees are walked without recursion, so besides the element being
+    written only O(depth) state is kept. The document namespace is written as the
+    default namespace; other namespaces get a prefix declared on the element that
+    first uses them.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[str], object],
+        ns: str,
+        pretty: bool = True,
+        namespaces: tuple[dict[str, str], dict[str, str]] | None = None,
+    ) -> None:
+        self._write = write
+        # For a fragment, `namespaces` comes from namespaces() of the document's writer.
+        hints, in_scope = namespaces or ({XSI_NS: "xsi", ns: ""}, {})
+        self._prefix_hints: dict[str, str] = dict(hints)
+        # URI -> prefix of the namespaces declared by the open elements (or, for a
+        # fragment, by the document it goes into).
+        self._in_scope: dict[str, str] = dict(in_scope)
+        self._scopes: list[list[str]] = []
+        # Tags in the (never redeclared) default namespace, mapped to their local name.
+        self._default_names: dict[str, str] = {}
+        self._indents: list[str] = ["\n"]
+        self._pretty = pretty
+
+    def hint_prefix(self, prefix: str, uri: str) -> None:
+        """Prefer `prefix` (e.g. taken from the input document) for `uri`."""
+        self._prefix_hints.setdefault(uri, prefix)
+
+    def namespaces(self) -> tuple[dict[str, str], dict[str, str]]:
+        """Prefix hints and declared namespaces, for the writer of a fragment that goes here."""
+        return dict(self._prefix_hints), dict(self._in_scope)
+
+    def declaration(self) -> None:
+        # Pretty-printed, the root's indentation starts its line.
+        self._write("<?xml version='1.0' encoding='utf-8'?>" + ("" if self._pretty else "\n"))
+
+    def finish(self) -> None:
+        self._write("\n")
+
+    def start(self, elem: ET.Element, level: int) -> None:
+        """Write the start tag (and any text) of an element that has children."""
+        tag, declared = self._open_tag(elem, level)
+        self._scopes.append(declared)
+        self._write(tag + ">")
+        if elem.text and elem.text.strip():
+            self._write(_escape_cdata(elem.text))
+
+    def end(self, elem: ET.Element, level: int) -> None:
+        """Close an element previously opened with start()."""
+        self._write(f"{self._indent(level)}</{self._name(elem.tag, [])}>")
+        self._close_scope(self._scopes.pop())
+        if elem.tail and elem.tail.strip():
+            self._write(_escape_cdata(elem.tail))
+
+    def element(self, elem: ET.Element, level: int) -> None:
+        """Write a complete element subtree."""
+        write = self._write
+        # (element, level, declared namespaces) to open, or to close when declared is None
+        pending: list[tuple[ET.Element, int, list[str] | None]] = [(elem, level, [])]
+        while pending:
+            e, lvl, declared = pending.pop()
+            if declared is None:
+                self.end(e, lvl)
+                continue
+
+            tag, declared = self._open_tag(e, lvl)
+            if len(e):
+                write(tag + ">")
+                if e.text and e.text.strip():
+                    write(_escape_cdata(e.text))
+                self._scopes.append(declared)
+                pending.append((e, lvl, None))
+                pending.extend([(c, lvl + 1, []) for c in reversed(e)])
+                continue
+
+            if e.text:
+                write(f"{tag}>{_escape_cdata(e.text)}</{self._name(e.tag, [])}>")
+            else:
+                write(tag + " />")
+            if declared:
+                self._close_scope(declared)
+            if e.tail and e.tail.strip():
+                write(_escape_cdata(e.tail))
+
+    def _indent(self, level: int) -> str:
+        if not self._pretty:
+            return ""
+        indents = self._indents
+        while len(indents) <= level:
+            indents.append("\n" + "  " * len(indents))
+        return indents[level]
+
+    def _open_tag(self, elem: ET.Element, level: int) -> tuple[str, list[str]]:
+        """Return the unterminated start tag and the namespaces it declares."""
+        name = self._default_names.get(elem.tag)
+        if name is not None and not elem.attrib:
+            return f"{self._indent(level)}<{name}", []
+
+        declared: list[str] = []
+        parts = [self._name(elem.tag, declared)]
+        attrs = [(self._name(k, declared), v) for k, v in elem.attrib.items()]
+        for uri in declared:
+            prefix = self._in_scope[uri]
+            parts.append(f'xmlns:{prefix}="{_escape_attrib(uri)}"' if prefix else f'xmlns="{_escape_attrib(uri)}"')
+        parts.extend(f'{k}="{_escape_attrib(v)}"' for k, v in attrs)
+        return self._indent(level) + "<" + " ".join(parts), declared
+
+    def _close_scope(self, declared: list[str]) -> None:
+        for uri in declared:
+            del self._in_scope[uri]
+
+    def _name(self, tag: str, declared: list[str]) -> str:
+        name = self._default_names.get(tag)
+        if name is not None:
+            return name
+        if not tag.startswith("{"):
+            return tag
+        uri, ln = tag[1:].split("}", 1)
+        prefix = self._in_scope.get(uri)
+        if prefix is None:
+            prefix = self._prefix_hints.get(uri)
+            if prefix is None or prefix in self._in_scope.values():
+                prefix = f"ns{len(self._in_scope)}"
+            self._in_scope[uri] = prefix
+            declared.append(uri)
+        if not prefix:
+            self._default_names[tag] = ln
+            return ln
+        return f"{prefix}:{ln}"
+
+class _LxmlWriter:
+    """
+    XmlWriter's interface on top of lxml's serializer, for lxml trees whose document
+    namespace is the default namespace of the root: subtrees are serialized in C,
+    minus the namespace declarations lxml repeats on each of them.
+    """
+
+    _XMLNS_RE = re.compile(r'\sxmlns(?::([\w.-]+))?="([^"]*)"')
+
+    def __init__(self, write: Callable[[str], object], pretty: bool = True) -> None:
+        self._write = write
+        self._pretty = pretty
+        # The namespaces in scope for the children of _scope_owner, see _serialize().
+        self._scope_owner: ET.Element | None = None
+        self._scope: dict[str | None, str] = {}
+
+    def declaration(self) -> None:
+        self._write("<?xml version='1.0' encoding='utf-8'?>" + ("" if self._pretty else "\n"))
+
+    def finish(self) -> None:
+        self._write("\n")
+
+    def start(self, elem: ET.Element, level: int) -> None:
+        empty = ET.Element(elem.tag, elem.attrib, nsmap=elem.nsmap)
+        tag = self._serialize(empty, level, elem.getparent())
+        self._write(tag[:-2] + ">")  # <a .../> -> <a ...>
+        if elem.text and elem.text.strip():
+            self._write(_escape_cdata(elem.text))
+
+    def end(self, elem: ET.Element, level: int) -> None:
+        name = f"{elem.prefix}:{localname(elem.tag)}" if elem.prefix else localname(elem.tag)
+        self._write(f"{self._indent(level)}</{name}>")
+
+    def element(self, elem: ET.Element, level: int) -> None:
+        if self._pretty:
+            ET.indent(elem, level=level)
+        self._write(self._serialize(elem, level, elem.getparent()))
+
+    def _indent(self, level: int) -> str:
+        return "\n" + "  " * level if self._pretty else ""
+
+    def _serialize(self, elem: ET.Element, level: int, parent: ET.Element | None) -> str:
+        text = ET.tostring(elem, encoding="unicode", with_tail=False)
+        if parent is not None:
+            # lxml declares every namespace in scope on the top element of the subtree.
+            # Drop those the ancestors already declared, but keep the element's own
+            # (e.g. an extension namespace declared on <Ntry>).
+            if parent is not self._scope_owner:
+                self._scope_owner, self._scope = parent, parent.nsmap
+            scope = self._scope
+            end = text.index(">")
+            head = self._XMLNS_RE.sub(lambda m: "" if scope.get(m[1]) == m[2] else m[0], text[:end])
+            text = head + text[end:]
+        return self._indent(level) + text
+
+def _escape_cdata(text: str) -> str:
+    return escape(text)
+
+def _escape_attrib(text: str) -> str:
+    return escape(text, {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"})
 
 def replace_namespace(root: ET.Element, old_ns: str, new_ns: str) -> None:
     """
     Rewrite all tags/attributes that use old_ns to new_ns.
-    This effectively "downgrades" the document to camt.053.001.02 namespace.
+    This effectively "downgrades" the document to camt.053.001.02 namespace;
+    apply_fixes() does the same renaming while it fixes.
     """
     for elem in root.iter():
-        if elem.tag.startswith("{"):
-            ns, ln = elem.tag[1:].split("}", 1)
+        _rename_element(elem, old_ns, new_ns)
+
+def _rename_element(elem: ET.Element, old_ns: str, new_ns: str) -> None:
+    if elem.tag.startswith("{"):
+        ns, ln = elem.tag[1:].split("}", 1)
+        if ns == old_ns:
+            elem.tag = qname(new_ns, ln)
+
+    # Attributes can also be namespaced; rarely used here, but we handle it.
+    if not any(k.startswith("{") for k in elem.attrib):
+        return
+    new_attrib = {}
+    changed = False
+    for k, v in elem.attrib.items():
+        if k.startswith("{"):
+            ns, ln = k[1:].split("}", 1)
             if ns == old_ns:
-                elem.tag = qname(new_ns, ln)
-
-        # Attributes can also be namespaced; rarely used here, but we handle it.
-        new_attrib = {}
-        changed = False
-        for k, v in elem.attrib.items():
-            if k.startswith("{"):
-                ns, ln = k[1:].split("}", 1)
-                if ns == old_ns:
-                    new_attrib[qname(new_ns, ln)] = v
-                    changed = True
-                else:
-                    new_attrib[k] = v
+                new_attrib[qname(new_ns, ln)] = v
+                changed = True
             else:
                 new_attrib[k] = v
-        if changed:
-            elem.attrib.clear()
-            elem.attrib.update(new_attrib)
+        else:
+            new_attrib[k] = v
+    if changed:
+        elem.attrib.clear()
+        elem.attrib.update(new_attrib)
+
+@lru_cache(maxsize=None)
+def ns_path(ns: str, path: str) -> str:
+    """Qualified ElementPath for a path of bare tag names separated by /."""
+    return "./" + "/".join(qname(ns, p) for p in path.split("/"))
 
 def findall_ns(elem: ET.Element, ns: str, path: str) -> list[ET.Element]:
     """
     Findall with a simple ns mapping. Path should use bare tag names separated by /.
     """
-    parts = path.split("/")
-    xpath = "."
-    for p in parts:
-        xpath += f"/{qname(ns, p)}"
-    return elem.findall(xpath)
+    return elem.findall(ns_path(ns, path))
 
 def findone_ns(elem: ET.Element, ns: str, path: str) -> ET.Element | None:
-    lst = findall_ns(elem, ns, path)
-    return lst[0] if lst else None
+    """First match of findall_ns(), without collecting the other matches."""
+    return elem.find(ns_path(ns, path))
 
 def ensure_child(parent: ET.Element, ns: str, tag: str) -> ET.Element:
-    child = parent.find(qname(ns, tag))
+    q = tag_table(ns)
+    child = find_child(parent, q[tag])
     if child is None:
-        child = ET.SubElement(parent, qname(ns, tag))
+        child = sub_element(parent, q[tag])
     return child
 
-def normalize_status(ntry: ET.Element, ns: str) -> None:
+def normalize_status(ntry: ET.Element, ns: str) -> bool:
     """
     Wise sometimes uses:
       <Sts><Cd>BOOK</Cd></Sts>
     Some importers expect:
       <Sts>BOOK</Sts>
+    Returns True if the status was flattened.
     """
-    sts = ntry.find(qname(ns, "Sts"))
+    q = tag_table(ns)
+    sts = find_child(ntry, q["Sts"])
     if sts is None:
-        return
+        return False
 
     # if it has a single child Cd and no direct text -> flatten
-    cd = sts.find(qname(ns, "Cd"))
-    if cd is not None and (sts.text or "").strip() == "":
-        val = (cd.text or "").strip()
+    cd = find_child(sts, q["Cd"])
+    if cd is not None and not text_of(sts):
+        val = text_of(cd)
         # Remove all children under <Sts>
         for child in list(sts):
             sts.remove(child)
         sts.text = val if val else "BOOK"
+        return True
+    return False
 
 def remove_total_entries(stmt: ET.Element, ns: str) -> None:
     """
     Remove <TtlNtries> blocks (some strict validators/importers reject them).
     """
-    for ttl in list(stmt.findall(f".//{qname(ns,'TtlNtries')}")):
-        parent = _find_parent(stmt, ttl)
-        if parent is not None:
-            parent.remove(ttl)
-
-def _find_parent(root: ET.Element, target: ET.Element) -> ET.Element | None:
-    for p in root.iter():
-        for c in list(p):
-            if c is target:
-                return p
-    return None
+    _run_fixes(stmt, ns, ("TtlNtries",))
 
 def normalize_dates(root: ET.Element, ns: str) -> None:
     """
     Convert <BookgDt><DtTm>...</DtTm></BookgDt> to <BookgDt><Dt>YYYY-MM-DD</Dt></BookgDt>
     Same for <ValDt>.
     """
-    for dt_container_tag in ("BookgDt", "ValDt"):
-        for container in root.findall(f".//{qname(ns, dt_container_tag)}"):
-            dt = container.find(qname(ns, "Dt"))
-            dttm = container.find(qname(ns, "DtTm"))
-            if dt is None and dttm is not None and (dttm.text or "").strip():
-                # extract date part
-                t = dttm.text.strip()
-                date_part = t.split("T", 1)[0]
-                # remove DtTm, add Dt
-                container.remove(dttm)
-                dt = ET.SubElement(container, qname(ns, "Dt"))
-                dt.text = date_part
-
-def ensure_acct_svcr_ref(ntry: ET.Element, ns: str) -> None:
-    """
-    Ensure <AcctSvcrRef> exists. If missing, attempt to derive from NtryRef / AddtlNtryInf.
-    """
-    acct_ref = ntry.find(qname(ns, "AcctSvcrRef"))
-    if acct_ref is not None and (acct_ref.text or "").strip():
-        return
+    _run_fixes(root, ns, DATE_CONTAINERS)
 
-    # candidate sources
-    ntry_ref = ntry.find(qname(ns, "NtryRef"))
-    addtl = ntry.find(qname(ns, "AddtlNtryInf"))
+def normalize_date_container(container: ET.Element, ns: str) -> bool:
+    """
+    Replace <DtTm> by a date-only <Dt> inside a single <BookgDt>/<ValDt>.
+    Returns True if a date was converted.
+    """
+    q = tag_table(ns)
+    dt = find_child(container, q["Dt"])
+    dttm = find_child(container, q["DtTm"])
+    t = text_of(dttm) if dt is None else ""
+    if t:
+        # extract date part
+        date_part = t.partition("T")[0]
+        # remove DtTm, add Dt
+        container.remove(dttm)
+        dt = sub_element(container, q["Dt"])
+        dt.text = date_part
+        return True
+    return False
 
-    value = None
-    if ntry_ref is not None and (ntry_ref.text or "").strip():
-        value = ntry_ref.text.strip()
-    elif addtl is not None and (addtl.text or "").strip():
-        # crude hash-like fallback from additional info
-        s = re.sub(r"\s+", " ", addtl.text.strip())
-        value = f"ADDINFO:{s[:60]}"
+def _entry_date(ntry: ET.Element, ns: str) -> str:
+    for path in ("BookgDt/Dt", "BookgDt/DtTm", "ValDt/Dt", "ValDt/DtTm"):
+        t = text_of(findone_ns(ntry, ns, path))
+        if t:
+            return t[:10]
+    return ""
+
+def synthetic_acct_svcr_ref(ntry: ET.Element, ns: str) -> str:
+    """
+    Deterministic reference for an entry without NtryRef: a digest of its amount,
+    currency, direction, booking date, counterparties and AddtlNtryInf. At most
+    35 characters (Max35Text), leaving room for a uniqueness suffix.
+    """
+    q = tag_table(ns)
+    amt = find_child(ntry, q["Amt"])
+    addtl = find_child(ntry, q["AddtlNtryInf"])
+    parts = [
+        text_of(amt),
+        amt.get("Ccy", "") if amt is not None else "",
+        text_of(find_child(ntry, q["CdtDbtInd"])),
+        _entry_date(ntry, ns),
+        collapse_whitespace(addtl.text) if addtl is not None and addtl.text else "",
+    ]
+    # Counterparty names: RltdPties/Cdtr/Nm in camt.053.001.02, RltdPties/Cdtr/Pty/Nm in .001.10
+    for party in findall_ns(ntry, ns, "NtryDtls/TxDtls/RltdPties/*"):
+        nm = find_child(party, q["Nm"])
+        if nm is None:
+            pty = find_child(party, q["Pty"])
+            nm = find_child(pty, q["Nm"]) if pty is not None else None
+        if nm is not None:
+            parts.append(text_of(nm))
+    digest = hashlib.blake2b("\0".join(parts).encode(), digest_size=12).hexdigest()
+    return f"{SYNTHETIC_REF_PREFIX}{digest}"
+
+def ensure_acct_svcr_ref(ntry: ET.Element, ns: str, seen: dict[str, int] | None = None) -> bool:
+    """
+    Ensure <AcctSvcrRef> exists. If missing, use NtryRef, else synthesize one with
+    synthetic_acct_svcr_ref(). `seen` counts the synthesized references of the
+    current statement; identical entries get "-2", "-3", ... in document order.
+    Returns True if a reference was synthesized.
+    """
+    q = tag_table(ns)
+    if text_of(find_child(ntry, q["AcctSvcrRef"])):
+        return False
+
+    ntry_ref = find_child(ntry, q["NtryRef"])
+    value = text_of(ntry_ref)
+    if not value:
+        value = synthetic_acct_svcr_ref(ntry, ns)
+        if seen is not None:
+            count = seen[value] = seen.get(value, 0) + 1
+            if count > 1:
+                value = f"{value}-{count}"
 
     if value:
         # Insert near NtryRef if possible, else append.
-        acct_ref = ET.Element(qname(ns, "AcctSvcrRef"))
+        acct_ref = ntry.makeelement(q["AcctSvcrRef"], {})
         acct_ref.text = value
         # place after NtryRef if present
         if ntry_ref is not None:
-            parent = ntry
-            idx = list(parent).index(ntry_ref)
-            parent.insert(idx + 1, acct_ref)
+            for idx, child in enumerate(ntry):
+                if child is ntry_ref:
+                    break
+            ntry.insert(idx + 1, acct_ref)
         else:
             ntry.append(acct_ref)
+        return True
+    return False
 
-def move_addtl_info_into_tx(ntry: ET.Element, ns: str) -> None:
+def move_addtl_info_into_tx(ntry: ET.Element, ns: str) -> bool:
     """
     Take <AddtlNtryInf> and ensure it is present as a transaction remittance:
       NtryDtls/TxDtls/RmtInf/Ustrd
     If NtryDtls/TxDtls doesn't exist, create minimal skeleton.
+    Returns True if the text was moved.
     """
-    addtl = ntry.find(qname(ns, "AddtlNtryInf"))
-    if addtl is None or not (addtl.text or "").strip():
-        return
-
-    text = addtl.text.strip()
+    q = tag_table(ns)
+    addtl = find_child(ntry, q["AddtlNtryInf"])
+    text = text_of(addtl)
+    if not text:
+        return False
 
     ntry_dtls = ensure_child(ntry, ns, "NtryDtls")
 
     # Prefer: NtryDtls/TxDtls (can be multiple)
-    tx_dtls_list = ntry_dtls.findall(qname(ns, "TxDtls"))
+    tx_dtls_list = ntry_dtls.findall(q["TxDtls"])
     if not tx_dtls_list:
-        tx = ET.SubElement(ntry_dtls, qname(ns, "TxDtls"))
+        tx = sub_element(ntry_dtls, q["TxDtls"])
         tx_dtls_list = [tx]
 
     for tx in tx_dtls_list:
-        rmt = tx.find(qname(ns, "RmtInf"))
+        rmt = find_child(tx, q["RmtInf"])
         if rmt is None:
-            rmt = ET.SubElement(tx, qname(ns, "RmtInf"))
+            rmt = sub_element(tx, q["RmtInf"])
         # append Ustrd (unstructured remittance)
-        ustrd = ET.SubElement(rmt, qname(ns, "Ustrd"))
+        ustrd = sub_element(rmt, q["Ustrd"])
         ustrd.text = text
 
     # Keep AddtlNtryInf or remove? Some importers dislike it; SimpleBooks often doesn't need it.
     # We'll remove it to reduce surprises.
     ntry.remove(addtl)
+    return True
+
+@dataclass
+class FixStats:
+    """
+    What one fix run did: wall time per stage in seconds, plus counters.
+    Returned by fix_wise_statement(); printed as JSON by --stats.
+    """
+
+    stages: dict[str, float] = field(default_factory=dict)
+    entries: int = 0
+    statuses_flattened: int = 0
+    refs_synthesized: int = 0
+    remittances_moved: int = 0
+    dates_converted: int = 0
+    total_entries_removed: int = 0
+    duplicates_removed: int = 0
+    statements_skipped: int = 0
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_counts(self, other: FixStats) -> None:
+        """Add the counters (not the timings) of `other`, e.g. from a worker process."""
+        for name, value in asdict(other).items():
+            if name != "stages":
+                setattr(self, name, getattr(self, name) + value)
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+def fix_entry(
+    ntry: ET.Element,
+    ns: str,
+    stats: FixStats | None = None,
+    seen_refs: dict[str, int] | None = None,
+) -> None:
+    """Apply all per-entry fixes to a single <Ntry>."""
+    flattened = normalize_status(ntry, ns)
+    synthesized = ensure_acct_svcr_ref(ntry, ns, seen_refs)
+    moved = move_addtl_info_into_tx(ntry, ns)
+    if stats is not None:
+        stats.entries += 1
+        stats.statuses_flattened += flattened
+        stats.refs_synthesized += synthesized
+        stats.remittances_moved += moved
+
+class FixContext:
+    """State shared by the fix handlers while walking one document."""
+
+    def __init__(self, ns: str, stats: FixStats | None = None) -> None:
+        self.ns = ns
+        self.stats = stats if stats is not None else FixStats()
+        self.seen_bk_to_cstmr_stmt = False
+        self.parent: ET.Element | None = None  # parent of the element being handled
+        self._ref_scope: ET.Element | None = None
+        self._synthetic_refs: dict[str, int] = {}
+
+    def synthetic_refs(self) -> dict[str, int]:
+        """Synthesized AcctSvcrRef counts for the statement holding the current entry."""
+        if self.parent is not self._ref_scope:
+            self._ref_scope = self.parent
+            self._synthetic_refs = {}
+        return self._synthetic_refs
+
+# A handler runs once the element's subtree is final and returns False to drop the element.
+FixHandler = Callable[[ET.Element, FixContext], bool]
+
+def _handle_ntry(ntry: ET.Element, ctx: FixContext) -> bool:
+    fix_entry(ntry, ctx.ns, ctx.stats, ctx.synthetic_refs())
+    return True
+
+def _handle_total_entries(ttl: ET.Element, ctx: FixContext) -> bool:
+    ctx.stats.total_entries_removed += 1
+    return False
+
+def _handle_date_container(container: ET.Element, ctx: FixContext) -> bool:
+    ctx.stats.dates_converted += normalize_date_container(container, ctx.ns)
+    return True
+
+def _handle_bk_to_cstmr_stmt(elem: ET.Element, ctx: FixContext) -> bool:
+    ctx.seen_bk_to_cstmr_stmt = True
+    return True
+
+FIX_HANDLERS: dict[str, FixHandler] = {
+    "Ntry": _handle_ntry,
+    "TtlNtries": _handle_total_entries,
+    "BookgDt": _handle_date_container,
+    "ValDt": _handle_date_container,
+    "BkToCstmrStmt": _handle_bk_to_cstmr_stmt,
+}
+
+def apply_fixes(
+    root: ET.Element,
+    ctx: FixContext,
+    old_ns: str | None = None,
+    parent: ET.Element | None = None,
+) -> bool:
+    """
+    Apply every FIX_HANDLERS fix to `root` in a single pass over the tree.
+
+    While walking, tags in `old_ns` are renamed to ctx.ns and elements that have a
+    handler for their local name are collected. The handlers then run deepest-first,
+    so each one sees its subtree already renamed and fixed, and siblings in document
+    order. `parent` is the parent of `root`, if any. Returns False if `root` itself
+    should be dropped.
+    """
+    prefix = f"{{{ctx.ns}}}"
+    plen = len(prefix)
+    old_prefix = f"{{{old_ns}}}" if old_ns is not None else None
+    handlers = FIX_HANDLERS
+    if HAVE_LXML and old_ns is None:
+        return _apply_fixes_lxml(root, ctx, parent)
+    todo: list[tuple[FixHandler, ET.Element, ET.Element | None]] = []
+
+    # Walk (parent, child) pairs so handlers that drop an element know its parent.
+    pairs = chain(((parent, root),), ((p, elem) for p in root.iter() for elem in p))
+    for parent, elem in pairs:
+        tag = elem.tag
+        if old_prefix is not None:
+            if tag.startswith(old_prefix):
+                tag = elem.tag = prefix + tag[len(old_prefix):]
+            if elem.attrib:
+                _rename_element(elem, old_ns, ctx.ns)
+        handler = handlers.get(tag[plen:]) if tag.startswith(prefix) else None
+        if handler is not None:
+            todo.append((handler, elem, parent))
+
+    # Ancestors are always collected before their descendants, and the children of
+    # one parent next to each other: run the runs of siblings last to first, each
+    # run in document order.
+    keep = True
+    end = len(todo)
+    while end:
+        start = end - 1
+        parent = todo[start][2]
+        while start and todo[start - 1][2] is parent:
+            start -= 1
+        ctx.parent = parent
+        for handler, elem, _ in todo[start:end]:
+            if not handler(elem, ctx):
+                if elem is root:
+                    keep = False
+                else:
+                    parent.remove(elem)
+        end = start
+    return keep
+
+def _apply_fixes_lxml(root: ET.Element, ctx: FixContext, parent: ET.Element | None) -> bool:
+    """
+    apply_fixes() for lxml trees: lxml finds the handled elements in C, already in
+    post-order (descendants first, siblings in document order), instead of Python
+    visiting every element.
+    """
+    q = tag_table(ctx.ns)
+    tags = [q[name] for name in FIX_HANDLERS]
+    plen = len(ctx.ns) + 2
+    todo = [elem for _, elem in ET.iterwalk(root, events=("end",), tag=tags)]
+    keep = True
+    for elem in todo:
+        ctx.parent = parent if elem is root else elem.getparent()
+        if not FIX_HANDLERS[elem.tag[plen:]](elem, ctx):
+            if elem is root:
+                keep = False
+            else:
+                ctx.parent.remove(elem)
+    return keep
+
+def _run_fixes(root: ET.Element, ns: str, names: Iterable[str]) -> None:
+    """
+    Run only the FIX_HANDLERS fixes for the local `names` on the elements below
+    `root`, for trees of either backend; elements a fix drops are removed.
+    """
+    ctx = FixContext(ns)
+    handlers = {qname(ns, name): FIX_HANDLERS[name] for name in names}
+    for parent in list(root.iter()):
+        for elem in [child for child in parent if child.tag in handlers]:
+            ctx.parent = parent
+            if not handlers[elem.tag](elem, ctx):
+                parent.remove(elem)
 
 def detect_namespace(root: ET.Element) -> str | None:
     if root.tag.startswith("{"):
         return root.tag[1:].split("}", 1)[0]
     return None
 
-def fix_wise_statement(input_path: Path, output_path: Path) -> None:
-    tree = ET.parse(str(input_path))
-    root = tree.getroot()
+# Input is fed to the parser in slices of this size.
+READ_CHUNK_SIZE = 1 << 20
+
+_ROOT_START_TAG_RE = re.compile(rb"<(?![?!])[^>]*>")
+_CAMT_10_DECL_RE = re.compile(rb"(\sxmlns(?::[\w.-]+)?\s*=\s*)([\"'])" + re.escape(CAMT_10.encode()) + rb"\2")
+_CAMT_10_RE = re.compile(re.escape(CAMT_10.encode()))
+
+# Compression recognised by file suffix, for inputs and outputs.
+COMPRESSED_SUFFIXES = (".gz", ".xz", ".zip")
+
+def _open_zip_member(path: Path) -> BinaryIO:
+    """The single XML member of a zip archive, opened for reading."""
+    with zipfile.ZipFile(path) as archive:
+        names = [n for n in archive.namelist() if n.lower().endswith(".xml")]
+        if len(names) != 1:
+            raise ValueError(f"{path}: expected one XML statement in the archive, found {len(names)}")
+        # The member keeps the archive file open after the ZipFile is closed.
+        return archive.open(names[0])
+
+_DECOMPRESSORS: dict[str, Callable[[Path], BinaryIO]] = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".zip": _open_zip_member,
+}
+
+def read_chunks(path: Path, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes | memoryview]:
+    """
+    Yield the contents of `path` in slices of `chunk_size` bytes.
+
+    .gz, .xz and .zip (single XML member) inputs are decompressed on the fly.
+    Other regular files are memory-mapped and each slice is a view into the mapping, so
+    the stdlib parser reads straight from the page cache (shared by every worker that
+    converts the same file) instead of from a private copy; lxml only takes bytes, so
+    there the slices are copied (see _feedable()). A slice is released once the
+    consumer asks for the next one, and its pages are dropped from the mapping, so
+    the resident size does not grow with the file. Anything that can't be mapped
+    (pipes, empty files) is read normally.
+    """
+    opener = _DECOMPRESSORS.get(path.suffix.lower())
+    if opener is not None:
+        with opener(path) as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+        return
+
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            while chunk := f.read(chunk_size):
+                yield chunk
+            return
+        # Offsets passed to madvise() must be page-aligned.
+        chunk_size = max(mmap.PAGESIZE, chunk_size - chunk_size % mmap.PAGESIZE)
+        release = getattr(mapped, "madvise", None) if hasattr(mmap, "MADV_DONTNEED") else None
+        with mapped, memoryview(mapped) as view:
+            for offset in range(0, len(view), chunk_size):
+                with view[offset:offset + chunk_size] as chunk:
+                    yield chunk
+                if release is not None:
+                    release(mmap.MADV_DONTNEED, offset, min(chunk_size, len(view) - offset))
+
+@contextmanager
+def open_output(path: Path) -> Iterator[TextIO]:
+    """
+    Text stream writing UTF-8 to `path`, compressed on the fly if it ends in .gz or
+    .xz. A .zip output gets a single member named after the archive, e.g.
+    statement_FIXED.zip -> statement_FIXED.xml.
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".gz":
+        with gzip.open(path, "wt", encoding="utf-8") as out:
+            yield out
+    elif suffix == ".xz":
+        with lzma.open(path, "wt", encoding="utf-8") as out:
+            yield out
+    elif suffix == ".zip":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(f"{path.stem}.xml", "w") as member:
+                with io.TextIOWrapper(member, encoding="utf-8") as out:
+                    yield out
+    else:
+        with open(path, "w", encoding="utf-8") as out:
+            yield out
+
+def downgrade_namespace_declaration(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Rewrite a camt.053.001.10 namespace declaration on the root element to 001.02
+    in the raw bytes, so the parser produces 001.02 tags directly and no element
+    has to be renamed afterwards. Input that doesn't match (other encodings, no
+    declaration on the root) passes through unchanged and is renamed as before;
+    so are elements that declare 001.10 again below the root.
+    """
+    head = b""
+    chunks = iter(chunks)
+    for chunk in chunks:
+        head += chunk
+        match = _ROOT_START_TAG_RE.search(head)
+        if match is not None:
+            end = match.end()
+            yield _CAMT_10_DECL_RE.sub(rb"\1\2" + CAMT_02.encode() + rb"\2", head[:end]) + head[end:]
+            break
+    else:
+        if head:
+            yield head
+        return
+    yield from chunks
+
+def _find_camt_10(chunks: Iterable[bytes], found: list[bool]) -> Iterator[bytes]:
+    """
+    Pass `chunks` through, appending True to `found` once the camt.053.001.10
+    namespace occurs in them. After downgrade_namespace_declaration() that means it
+    is declared again below the root, e.g. on <BkToCstmrStmt>.
+    """
+    overlap = len(CAMT_10) - 1
+    tail = b""
+    for chunk in chunks:
+        if not found:
+            # The slices of an mmap are searched in place; only the ends are copied.
+            window = tail + bytes(chunk[:overlap])
+            if _CAMT_10_RE.search(chunk) or _CAMT_10_RE.search(window):
+                found.append(True)
+            else:
+                tail = window[-overlap:] if len(chunk) < overlap else bytes(chunk[-overlap:])
+        yield chunk
+
+# lxml keeps comments and processing instructions in the tree; the stdlib parser
+# drops them, and so does everything downstream.
+_LXML_PARSER_OPTIONS = {"remove_comments": True, "remove_pis": True, "huge_tree": True}
+
+def _feedable(chunks: Iterable[bytes]) -> Iterable[bytes]:
+    # lxml parsers only accept bytes, not memoryview slices of an mmap.
+    if not HAVE_LXML:
+        return chunks
+    return (c if isinstance(c, bytes) else bytes(c) for c in chunks)
+
+class _PrefixRecorder(ET.TreeBuilder):
+    """TreeBuilder that also records the (prefix, uri) namespace declarations it sees."""
+
+    def __init__(self, prefixes: list[tuple[str, str]]) -> None:
+        super().__init__()
+        self._prefixes = prefixes
+
+    def start_ns(self, prefix: str, uri: str) -> None:
+        self._prefixes.append((prefix, uri))
+
+def _parse_chunks(chunks: Iterable[bytes], prefixes: list[tuple[str, str]] | None = None) -> ET.Element:
+    """
+    Parse a whole document. With the stdlib parser, whose elements don't keep their
+    prefixes, the namespace declarations are appended to `prefixes` if given.
+    """
+    if HAVE_LXML:
+        # Blank text is dropped so that lxml can pretty-print the tree itself.
+        parser = ET.XMLParser(remove_blank_text=True, **_LXML_PARSER_OPTIONS)
+    elif prefixes is not None:
+        parser = ET.XMLParser(target=_PrefixRecorder(prefixes))
+    else:
+        parser = ET.XMLParser()
+    for chunk in _feedable(chunks):
+        parser.feed(chunk)
+    return parser.close()
+
+def _iterparse_chunks(chunks: Iterable[bytes], events: tuple[str, ...]) -> Iterator[tuple[str, object]]:
+    if HAVE_LXML:
+        parser = ET.XMLPullParser(events, **_LXML_PARSER_OPTIONS)
+    else:
+        parser = ET.XMLPullParser(events)
+    for chunk in _feedable(chunks):
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+def _parse_document(
+    chunks: Iterable[bytes], stats: FixStats, prefixes: list[tuple[str, str]] | None = None
+) -> tuple[ET.Element, str, str | None]:
+    """
+    Parse a whole document; returns the root, the namespace to write and the
+    namespace its tags have to be renamed from (None if they don't). `prefixes`
+    works as in _parse_chunks().
+    """
+    camt_10: list[bool] = []
+    with stats.timed("parse"):
+        root = _parse_chunks(_find_camt_10(chunks, camt_10), prefixes)
 
     ns = detect_namespace(root)
     if ns is None:
         raise ValueError("Input XML has no namespace; expected ISO 20022 camt.053.")
 
     # If it's already camt.053.001.02, we still normalize the problematic structures.
-    # If it's Wise camt.053.001.10, downgrade to 001.02.
-    if ns == CAMT_10:
-        replace_namespace(root, CAMT_10, CAMT_02)
-        ns = CAMT_02
+    # If it's Wise camt.053.001.10, downgrade to 001.02; that includes elements
+    # that declare 001.10 again below a root rewritten to 001.02.
+    if ns == CAMT_10 or (ns == CAMT_02 and camt_10):
+        return root, CAMT_02, CAMT_10
+    return root, ns, None
 
+def _check_statement(ctx: FixContext) -> None:
     # Basic sanity: must contain BkToCstmrStmt
-    if root.find(f".//{qname(ns,'BkToCstmrStmt')}") is None:
+    if not ctx.seen_bk_to_cstmr_stmt:
+        raise ValueError("Could not find BkToCstmrStmt; not a camt.053 statement?")
+
+@dataclass(frozen=True)
+class StatementFilter:
+    """
+    Which <Stmt> blocks of a document to keep, by account (IBAN, or other id) and
+    account currency; an empty set matches anything. Statements that don't match
+    are dropped without being fixed.
+    """
+
+    accounts: frozenset[str] = frozenset()
+    currencies: frozenset[str] = frozenset()
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "accounts", frozenset(_normalize_account(a) for a in self.accounts))
+        object.__setattr__(self, "currencies", frozenset(c.strip().upper() for c in self.currencies))
+
+    def matches(self, account: str, currency: str) -> bool:
+        return (not self.accounts or _normalize_account(account) in self.accounts) and (
+            not self.currencies or currency.upper() in self.currencies
+        )
+
+def _normalize_account(account: str) -> str:
+    # IBANs are often written in groups of four: "GB11 TEST 0001"
+    return "".join(account.split()).upper()
+
+def _children_released(parent: ET.Element) -> Iterator[ET.Element]:
+    """
+    Yield the children of `parent`, emptying each once the next one is asked for,
+    and `parent` itself at the end. Emptied rather than removed: lxml frees a
+    subtree quickly but detaches one slowly, and counting children is O(n) there.
+    """
+    for child in parent:
+        yield child
+        child.clear()
+    parent.clear()
+
+class _StatementDocument:
+    """
+    A parsed document that is fixed and written one <Stmt> at a time: everything
+    around the statements is fixed up front (so invalid input fails before any
+    output exists), each statement is then fixed right before it is written and
+    freed right after, so output starts after the first statement rather than
+    after the whole document, and memory shrinks while writing.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], stats: FixStats, select: StatementFilter | None = None) -> None:
+        self.prefixes: list[tuple[str, str]] = []  # stdlib backend only, see _parse_chunks()
+        self.root, self.ns, self.old_ns = _parse_document(chunks, stats, self.prefixes)
+        self.ctx = FixContext(self.ns, stats)
+        root = self.root
+        # Whether lxml can serialize the statements itself (see write()).
+        self.lxml_native = HAVE_LXML and self.old_ns is None and root.nsmap.get(None) == self.ns
+        if self.old_ns is not None and detect_namespace(root) == self.ns:
+            # camt.053.001.10 declared again below a root rewritten to 001.02: rename
+            # up front, so that the statements can be found by their tags.
+            for elem in root.iter():
+                _rename_element(elem, self.old_ns, self.ns)
+            self.old_ns = None
+        q = tag_table(self.old_ns or self.ns)
+
+        with stats.timed("fix"):
+            bks = root.findall(q["BkToCstmrStmt"])
+            for bk in bks:
+                for child in list(bk):
+                    if child.tag != q["Stmt"]:
+                        if not apply_fixes(child, self.ctx, old_ns=self.old_ns, parent=bk):
+                            bk.remove(child)
+                    elif select is not None and not select.matches(*account_key(child, self.old_ns or self.ns)):
+                        child.clear()
+                        bk.remove(child)
+                        stats.statements_skipped += 1
+            for elem, parent in (*((bk, root) for bk in bks), (root, None)):
+                self._fix_alone(elem, parent)
+            _check_statement(self.ctx)
+
+    def _fix_alone(self, elem: ET.Element, parent: ET.Element | None) -> None:
+        """Rename `elem` and run its handler, without touching its children."""
+        ctx = self.ctx
+        if self.old_ns is not None:
+            _rename_element(elem, self.old_ns, ctx.ns)
+        handler = FIX_HANDLERS.get(localname(elem.tag)) if elem.tag.startswith(f"{{{ctx.ns}}}") else None
+        if handler is not None:
+            ctx.parent = parent
+            handler(elem, ctx)
+
+    def write(self, write: Callable[[str], object], pretty: bool = True, columns: EntryColumns | None = None) -> None:
+        root, ns, ctx = self.root, self.ns, self.ctx
+        stats = ctx.stats
+        q = tag_table(ns)
+        stmt_tag = qname(self.old_ns or ns, "Stmt")  # statements weren't renamed yet
+        started = time.perf_counter()
+        before = stats.stages.get("fix", 0.0) + stats.stages.get("columns", 0.0)
+
+        writer: XmlWriter | _LxmlWriter
+        if self.lxml_native:
+            # The document namespace already is the default namespace (the declaration
+            # was rewritten before parsing): let lxml serialize the statements in C.
+            writer = _LxmlWriter(write, pretty)
+        else:
+            writer = XmlWriter(write, ns, pretty)
+            # Keep the input's prefixes for other namespaces, as the streaming engine does.
+            if HAVE_LXML:
+                prefixes = (item for _, item in ET.iterwalk(root, events=("start-ns",)))
+            else:
+                prefixes = self.prefixes
+            for prefix, uri in prefixes:
+                writer.hint_prefix(prefix or "", uri)
+        writer.declaration()
+        writer.start(root, 0)
+        for child in _children_released(root):
+            if child.tag != q["BkToCstmrStmt"]:
+                writer.element(child, 1)
+                continue
+            writer.start(child, 1)
+            for elem in _children_released(child):
+                if elem.tag != stmt_tag:
+                    writer.element(elem, 2)
+                    continue
+                with stats.timed("fix"):
+                    apply_fixes(elem, ctx, old_ns=self.old_ns, parent=child)
+                if columns is not None:
+                    with stats.timed("columns"):
+                        collect_columns(elem, ns, columns)
+                # Entry by entry, so that serializing never holds a second copy of the statement.
+                writer.start(elem, 2)
+                for part in _children_released(elem):
+                    writer.element(part, 3)
+                writer.end(elem, 2)
+            writer.end(child, 1)
+        writer.end(root, 0)
+        writer.finish()
+
+        fixing = stats.stages.get("fix", 0.0) + stats.stages.get("columns", 0.0) - before
+        stats.add_time("write", time.perf_counter() - started - fixing)
+
+def fix_wise_statement(
+    input_path: Path,
+    output_path: Path,
+    pretty: bool = True,
+    columns: EntryColumns | None = None,
+    select: StatementFilter | None = None,
+) -> FixStats:
+    """
+    Fix a statement file in memory, writing each <Stmt> as soon as it is fixed.
+    Only the statements matching `select` are kept. If `columns` is given, the
+    fixed entries are also appended to it (see EntryColumns), without parsing the
+    output again.
+    """
+    stats = FixStats()
+    document = _StatementDocument(downgrade_namespace_declaration(read_chunks(input_path)), stats, select)
+    with open_output(output_path) as out:
+        document.write(out.write, pretty, columns)
+    return stats
+
+# Anything the in-memory API accepts as input: the whole document, a binary file
+# object, or an iterable of byte chunks (e.g. an HTTP request body).
+StatementSource = Union[bytes, bytearray, memoryview, BinaryIO, Iterable[bytes]]
+
+def source_chunks(source: StatementSource, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield bytes(source)
+    elif hasattr(source, "read"):
+        while chunk := source.read(chunk_size):
+            yield chunk
+    else:
+        yield from source
+
+def fix_wise_stream(
+    source: StatementSource,
+    dest: BinaryIO,
+    pretty: bool = True,
+    streaming: bool = False,
+    columns: EntryColumns | None = None,
+    select: StatementFilter | None = None,
+) -> FixStats:
+    """
+    Fix a statement read from bytes, a binary file object or an iterable of chunks,
+    writing the UTF-8 output to the binary file object `dest` (which is left open).
+    `columns` and `select` work as in fix_wise_statement().
+
+    With `streaming`, output is produced while the input is still being read, so on
+    invalid input `dest` may already hold a partial document.
+    """
+    chunks = downgrade_namespace_declaration(source_chunks(source))
+    out = io.TextIOWrapper(dest, encoding="utf-8", newline="\n")
+    try:
+        if streaming:
+            return _fix_stream(chunks, out.write, pretty, columns, select)
+        stats = FixStats()
+        _StatementDocument(chunks, stats, select).write(out.write, pretty, columns)
+        return stats
+    finally:
+        out.detach()
+
+def fix_wise_bytes(source: StatementSource, pretty: bool = True) -> bytes:
+    """Fix a statement held in memory and return the fixed document as bytes."""
+    dest = io.BytesIO()
+    fix_wise_stream(source, dest, pretty)
+    return dest.getvalue()
+
+def fix_wise_statement_streaming(
+    input_path: Path,
+    output_path: Path,
+    pretty: bool = True,
+    columns: EntryColumns | None = None,
+    select: StatementFilter | None = None,
+) -> FixStats:
+    """
+    Streaming variant of fix_wise_statement() for very large statements.
+
+    The input is read with iterparse; every <Ntry> is fixed as soon as its end tag
+    is seen, written out and dropped, so memory use does not grow with the number
+    of entries. The output is removed again if the input turns out to be invalid.
+    Parsing, fixing and writing interleave; the "parse" stage is the remainder.
+    `columns` and `select` work as in fix_wise_statement(); a statement is held
+    back until its <Acct> has been read and skipped unfixed if it doesn't match.
+    """
+    try:
+        with open_output(output_path) as out:
+            chunks = downgrade_namespace_declaration(read_chunks(input_path))
+            return _fix_stream(chunks, out.write, pretty, columns, select)
+    except Exception:
+        output_path.unlink(missing_ok=True)
+        raise
+
+def fix_wise_statement_parallel(
+    input_path: Path,
+    output_path: Path,
+    pretty: bool = True,
+    jobs: int | None = None,
+    select: StatementFilter | None = None,
+) -> FixStats:
+    """
+    fix_wise_statement_streaming() with the entries fixed by a pool of `jobs` worker
+    processes (default: one per CPU), for single statements too big for one core.
+    This process parses the input and hands the <Ntry> elements out in shards of
+    SHARD_ENTRIES; everything else, and the order of the output, stays here. The
+    output is identical to that of fix_wise_statement_streaming(). In the stats,
+    waiting for the workers counts as "fix".
+    """
+    jobs = jobs or os.cpu_count() or 1
+    try:
+        with open_output(output_path) as out, ProcessPoolExecutor(max_workers=jobs) as pool:
+            shards = _EntryShards(pool, out.write, pretty, max_pending=2 * jobs)
+            chunks = downgrade_namespace_declaration(read_chunks(input_path))
+            return _fix_stream(chunks, shards.write, pretty, select=select, shards=shards)
+    except Exception:
+        output_path.unlink(missing_ok=True)
+        raise
+
+# Subtrees that the streaming engine buffers and fixes as a whole (<Acct> so that
+# entries can be tagged with their account).
+_STREAM_UNITS = frozenset(("Ntry", "TtlNtries", "Acct", *DATE_CONTAINERS))
+
+def _fix_stream(
+    chunks: Iterable[bytes],
+    write: Callable[[str], object],
+    pretty: bool = True,
+    columns: EntryColumns | None = None,
+    select: StatementFilter | None = None,
+    shards: _EntryShards | None = None,
+) -> FixStats:
+    started = time.perf_counter()
+    stats = FixStats(stages={"parse": 0.0, "fix": 0.0, "write": 0.0})
+    clock = time.perf_counter
+    ns: str | None = None
+    downgrade = False
+    writer: XmlWriter | None = None
+    prefix_hints: list[tuple[str, str]] = []
+
+    ctx: FixContext | None = None
+    stack: list[ET.Element] = []  # open elements outside a buffered subtree
+    opened = 0                    # stack[:opened] already have their start tag written
+    unit: ET.Element | None = None
+    unit_depth = 0
+    account = ""
+    # The current <Stmt>, and whether it is kept: None until its <Acct> was read
+    # (only with `select`), in which case nothing of it has been written yet.
+    stmt: ET.Element | None = None
+    selected: bool | None = None
+    skip_depth = -1               # >= 0 while inside a statement that is dropped
+
+    def open_pending() -> None:
+        nonlocal opened
+        while opened < len(stack):
+            writer.start(stack[opened], opened)
+            opened += 1
+
+    for event, item in _iterparse_chunks(chunks, ("start-ns", "start", "end")):
+        if event == "start-ns":
+            if writer is not None:
+                writer.hint_prefix(*item)
+                # 001.10 declared again below a root rewritten to 001.02
+                downgrade = downgrade or (ns == CAMT_02 and item[1] == CAMT_10)
+            else:
+                prefix_hints.append(item)
+            continue
+
+        elem = item
+        if event == "start":
+            if ns is None:
+                ns = detect_namespace(elem)
+                if ns is None:
+                    raise ValueError("Input XML has no namespace; expected ISO 20022 camt.053.")
+                if ns == CAMT_10:
+                    downgrade = True
+                    ns = CAMT_02
+                ctx = FixContext(ns, stats)
+                writer = XmlWriter(write, ns, pretty)
+                for prefix, uri in prefix_hints:
+                    writer.hint_prefix(prefix, uri)
+                writer.declaration()
+            if skip_depth >= 0:
+                skip_depth += 1
+                continue
+            if downgrade:
+                _rename_element(elem, CAMT_10, CAMT_02)
+
+            if unit is not None:
+                unit_depth += 1
+                continue
+            name = localname(elem.tag)
+            if name in _STREAM_UNITS:
+                unit, unit_depth = elem, 1
+                continue
+            stack.append(elem)
+            if name == "Stmt":
+                stmt, selected = elem, (None if select is not None else True)
+            continue
+
+        # event == "end"
+        if skip_depth >= 0:
+            if skip_depth:
+                skip_depth -= 1
+                if not skip_depth:
+                    stmt.remove(elem)
+                continue
+            # The end of the dropped statement itself
+            stack.pop()
+            if stack:
+                stack[-1].remove(elem)
+            stmt, selected, skip_depth = None, None, -1
+            continue
+
+        if unit is not None:
+            unit_depth -= 1
+            if unit_depth:
+                continue
+            if selected is None and stack and stack[-1] is stmt and localname(unit.tag) == "Acct":
+                ccy = findone_ns(unit, ns, "Ccy")
+                # Only what precedes <Acct>: the parser may have added later siblings already.
+                held = []
+                for child in stmt:
+                    if child is unit:
+                        break
+                    held.append(child)
+                if not select.matches(account_id(unit, ns), text_of(ccy)):
+                    for child in (*held, unit):
+                        stmt.remove(child)
+                    stats.statements_skipped += 1
+                    unit, skip_depth = None, 0
+                    continue
+                # Kept: write what was held back of the statement so far.
+                selected = True
+                open_pending()
+                for child in held:
+                    writer.element(child, len(stack))
+                    stmt.remove(child)
+            t0 = clock()
+            if shards is not None and selected and stack and localname(unit.tag) == "Ntry":
+                open_pending()
+                shards.add(unit, stack[-1], len(stack), writer)
+                stats.stages["fix"] += clock() - t0
+                stack[-1].remove(unit)
+                unit = None
+                continue
+            keep = apply_fixes(unit, ctx, parent=stack[-1] if stack else None)
+            if columns is not None:
+                name = localname(unit.tag)
+                if name == "Acct":
+                    account = account_id(unit, ns)
+                elif name == "Ntry" and keep:
+                    columns.append(Entry.from_element(unit, ns, account))
+            t1 = clock()
+            if selected is None and stmt is not None:
+                # Held back with the rest of the statement until its <Acct> is read.
+                stats.stages["fix"] += t1 - t0
+                if not keep:
+                    stack[-1].remove(unit)
+                unit = None
+                continue
+            if keep:
+                open_pending()
+                writer.element(unit, len(stack))
+            stats.stages["fix"] += t1 - t0
+            stats.stages["write"] += clock() - t1
+            if stack:
+                stack[-1].remove(unit)
+            unit = None
+            continue
+
+        level = len(stack) - 1
+        stack.pop()
+        name = localname(elem.tag)
+        handler = FIX_HANDLERS.get(name)
+        if handler is not None:
+            ctx.parent = stack[-1] if stack else None
+            handler(elem, ctx)
+        if elem is stmt:
+            if selected is None:
+                # A statement without <Acct>
+                selected = select.matches("", "")
+                if not selected:
+                    stats.statements_skipped += 1
+                    if stack:
+                        stack[-1].remove(elem)
+                    stmt = None
+                    continue
+            stmt = None
+        elif selected is None and stmt is not None:
+            continue
+        if opened > level:
+            writer.end(elem, level)
+            opened = level
+        else:
+            open_pending()
+            writer.element(elem, level)
+        if stack:
+            stack[-1].remove(elem)
+
+    if ctx is None or not ctx.seen_bk_to_cstmr_stmt:
+        raise ValueError("Could not find BkToCstmrStmt; not a camt.053 statement?")
+    writer.finish()
+    if shards is not None:
+        stats.add_counts(shards.stats)
+        for stage, seconds in shards.stats.stages.items():
+            stats.add_time(stage, seconds)
+    stages = stats.stages
+    stages["parse"] = max(0.0, clock() - started - stages["fix"] - stages["write"])
+    return stats
+
+# <Ntry> elements per task of fix_wise_statement_parallel()
+SHARD_ENTRIES = 1000
+
+_SYNTHETIC_REF_RE = re.compile(rf">({re.escape(SYNTHETIC_REF_PREFIX)}[0-9a-f]+)(?:-(\d+))?<")
+
+class _EntryShards:
+    """
+    The entries of a streaming run fixed in a process pool. Raw <Ntry> elements are
+    serialized into shards, which _fix_entry_shard() fixes and writes in a worker;
+    the results are written in document order. All other output goes through
+    write(), which first writes the shards still pending, so the entries end up
+    exactly where the serial engine puts them. At most `max_pending` shards are in
+    flight.
+
+    Workers number repeated synthetic references (see ensure_acct_svcr_ref()) within
+    their shard only; the counts of the statement so far are kept here and a shard
+    whose references were seen before is renumbered before it is written.
+    """
+
+    def __init__(
+        self, pool: ProcessPoolExecutor, write: Callable[[str], object], pretty: bool, max_pending: int
+    ) -> None:
+        self.stats = FixStats()
+        self._pool = pool
+        self._write = write
+        self._pretty = pretty
+        self._max_pending = max_pending
+        self._batch: list[bytes] = []
+        self._task: tuple[str, int] | None = None  # ns, level
+        self._writer: XmlWriter | None = None
+        self._parent: ET.Element | None = None
+        self._new_parent = False
+        # (result, whether it starts a new statement) per shard in flight, in order
+        self._pending: deque[tuple[Future, bool]] = deque()
+        self._refs: dict[str, int] = {}
+
+    def add(self, ntry: ET.Element, parent: ET.Element, level: int, writer: XmlWriter) -> None:
+        """Queue an unfixed <Ntry> of `parent`, to be written at `level`."""
+        if parent is not self._parent:
+            self._submit()
+            self._parent, self._new_parent = parent, True
+        if not self._batch:
+            self._task, self._writer = (detect_namespace(ntry), level), writer
+        self._batch.append(ET.tostring(ntry))
+        if len(self._batch) >= SHARD_ENTRIES:
+            self._submit()
+
+    def write(self, text: str) -> None:
+        if self._batch:
+            self._submit()
+        while self._pending:
+            self._write_next()
+        self._write(text)
+
+    def _submit(self) -> None:
+        if not self._batch:
+            return
+        shard = b"<Shard>" + b"".join(self._batch) + b"</Shard>"
+        # Taken now rather than at the first entry: later entries may have added prefix hints.
+        namespaces = self._writer.namespaces()
+        future = self._pool.submit(_fix_entry_shard, shard, *self._task, namespaces, self._pretty)
+        self._pending.append((future, self._new_parent))
+        self._batch, self._new_parent = [], False
+        while len(self._pending) > self._max_pending:
+            self._write_next()
+
+    def _write_next(self) -> None:
+        future, new_parent = self._pending.popleft()
+        with self.stats.timed("fix"):
+            text, refs, stats = future.result()
+        if new_parent:
+            self._refs = {}
+        offsets = {}
+        for ref, count in refs.items():
+            before = self._refs.get(ref, 0)
+            if before:
+                offsets[ref] = before
+            self._refs[ref] = before + count
+        if offsets:
+            text = _SYNTHETIC_REF_RE.sub(
+                lambda m: f">{m[1]}-{offsets[m[1]] + int(m[2] or 1)}<" if m[1] in offsets else m[0], text
+            )
+        self.stats.add_counts(stats)
+        with self.stats.timed("write"):
+            self._write(text)
+
+def _fix_entry_shard(
+    shard: bytes,
+    ns: str,
+    level: int,
+    namespaces: tuple[dict[str, str], dict[str, str]],
+    pretty: bool,
+) -> tuple[str, dict[str, int], FixStats]:
+    """
+    Worker side of _EntryShards: fix the entries of a shard and write them. Returns
+    the text, the synthesized references with their counts, and the stats.
+    """
+    root = _parse_chunks((shard,))
+    ctx = FixContext(ns)
+    out = io.StringIO()
+    writer = XmlWriter(out.write, ns, pretty, namespaces)
+    for ntry in list(root):
+        if apply_fixes(ntry, ctx, parent=root):
+            writer.element(ntry, level)
+    ctx.parent = root
+    return out.getvalue(), ctx.synthetic_refs(), ctx.stats
+
+# --- Entry records -------------------------------------------------------------
+
+class Entry:
+    """
+    The fields of one <Ntry> that analytics and deduplication need, without the
+    element tree: a record of plain (interned where repetitive) strings costs a
+    fraction of the ~20 Elements an entry parses into.
+
+    to_element() writes a camt.053.001.02 <Ntry> holding just these fields; anything
+    else the original entry had (related parties, references, ...) is not kept.
+    """
+
+    # A plain class rather than @dataclass(slots=True), which needs Python 3.10.
+    __slots__ = (
+        "amount",
+        "currency",
+        "credit_debit",
+        "status",
+        "booking_date",
+        "value_date",
+        "entry_ref",
+        "acct_svcr_ref",
+        "bank_tx_code",
+        "remittance",
+        "account",
+    )
+
+    def __init__(
+        self,
+        amount: str,
+        currency: str,
+        credit_debit: str,
+        status: str = "",
+        booking_date: str = "",
+        value_date: str = "",
+        entry_ref: str = "",
+        acct_svcr_ref: str = "",
+        bank_tx_code: str = "",
+        remittance: tuple[str, ...] = (),
+        account: str = "",
+    ) -> None:
+        self.amount = amount
+        self.currency = currency
+        self.credit_debit = credit_debit
+        self.status = status
+        self.booking_date = booking_date
+        self.value_date = value_date
+        self.entry_ref = entry_ref
+        self.acct_svcr_ref = acct_svcr_ref
+        self.bank_tx_code = bank_tx_code
+        self.remittance = remittance
+        self.account = account
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None  # mutable, like a dataclass with eq=True
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={value!r}" for name, value in zip(self.__slots__, self._values()))
+        return f"{self.__class__.__name__}({fields})"
+
+    @classmethod
+    def from_element(cls, ntry: ET.Element, ns: str, account: str = "") -> Entry:
+        """Read a (fixed) <Ntry>; `account` is the IBAN or other id of its statement."""
+        q = tag_table(ns)
+        amt = find_child(ntry, q["Amt"])
+        sts = find_child(ntry, q["Sts"])
+        status = text_of(sts) or text_of(find_child(sts, q["Cd"])) if sts is not None else ""
+        remittance = [text_of(u) for u in findall_ns(ntry, ns, "NtryDtls/TxDtls/RmtInf/Ustrd")]
+        addtl = text_of(find_child(ntry, q["AddtlNtryInf"]))
+        if addtl:
+            remittance.append(addtl)
+        intern = sys.intern
+        return cls(
+            amount=text_of(amt),
+            currency=intern(amt.get("Ccy", "")) if amt is not None else "",
+            credit_debit=intern(text_of(find_child(ntry, q["CdtDbtInd"]))),
+            status=intern(status),
+            booking_date=_container_date(find_child(ntry, q["BookgDt"]), ns),
+            value_date=_container_date(find_child(ntry, q["ValDt"]), ns),
+            entry_ref=text_of(find_child(ntry, q["NtryRef"])),
+            acct_svcr_ref=text_of(find_child(ntry, q["AcctSvcrRef"])),
+            bank_tx_code=intern(text_of(findone_ns(ntry, ns, "BkTxCd/Prtry/Cd"))),
+            remittance=tuple(remittance),
+            account=intern(account),
+        )
+
+    def to_element(self, ns: str = CAMT_02) -> ET.Element:
+        """Build a <Ntry> from the record, children in camt.053.001.02 schema order."""
+        q = tag_table(ns)
+        ntry = ET.Element(q["Ntry"])
+
+        def add(parent: ET.Element, name: str, text: str) -> ET.Element:
+            child = ET.SubElement(parent, q[name])
+            child.text = text
+            return child
+
+        if self.entry_ref:
+            add(ntry, "NtryRef", self.entry_ref)
+        add(ntry, "Amt", self.amount).set("Ccy", self.currency)
+        add(ntry, "CdtDbtInd", self.credit_debit)
+        if self.status:
+            add(ntry, "Sts", self.status)
+        for name, value in (("BookgDt", self.booking_date), ("ValDt", self.value_date)):
+            if value:
+                add(ET.SubElement(ntry, q[name]), "Dt", value)
+        if self.acct_svcr_ref:
+            add(ntry, "AcctSvcrRef", self.acct_svcr_ref)
+        if self.bank_tx_code:
+            prtry = ET.SubElement(ET.SubElement(ntry, q["BkTxCd"]), q["Prtry"])
+            add(prtry, "Cd", self.bank_tx_code)
+        if self.remittance:
+            tx = ET.SubElement(ET.SubElement(ntry, q["NtryDtls"]), q["TxDtls"])
+            rmt = ET.SubElement(tx, q["RmtInf"])
+            for line in self.remittance:
+                add(rmt, "Ustrd", line)
+        return ntry
+
+def _container_date(container: ET.Element | None, ns: str) -> str:
+    if container is None:
+        return ""
+    q = tag_table(ns)
+    return text_of(find_child(container, q["Dt"])) or text_of(find_child(container, q["DtTm"]))[:10]
+
+def account_id(acct: ET.Element, ns: str) -> str:
+    """IBAN of an <Acct>, else its other identification."""
+    elem = findone_ns(acct, ns, "Id/IBAN")
+    if elem is None:
+        elem = findone_ns(acct, ns, "Id/Othr/Id")
+    return text_of(elem)
+
+# Amounts are stored as integers in units of 10**-AMOUNT_DECIMALS (ISO 4217 has
+# currencies with up to four minor digits).
+AMOUNT_DECIMALS = 4
+_AMOUNT_SCALE = 10**AMOUNT_DECIMALS
+
+def _scaled_amount(text: str) -> int:
+    whole, _, frac = text.partition(".")
+    if len(frac) <= AMOUNT_DECIMALS and (whole.lstrip("-").isdigit() or not whole) and (frac.isdigit() or not frac):
+        value = int(whole or "0") * _AMOUNT_SCALE
+        scaled = int(frac.ljust(AMOUNT_DECIMALS, "0")) if frac else 0
+        return value - scaled if text.startswith("-") else value + scaled
+    return int((Decimal(text) * _AMOUNT_SCALE).to_integral_value())
+
+def _format_amount(value: int) -> str:
+    whole, frac = divmod(abs(value), _AMOUNT_SCALE)
+    digits = f"{frac:0{AMOUNT_DECIMALS}d}".rstrip("0").ljust(2, "0")
+    return f"{'-' if value < 0 else ''}{whole}.{digits}"
+
+def _date_ordinal(text: str) -> int:
+    try:
+        return date.fromisoformat(text).toordinal() if text else 0
+    except ValueError:
+        return 0
+
+class EntryColumns:
+    """
+    Fixed entries as columns, for ledgers and dataframes: amounts as scaled
+    integers (array "q"), dates as proleptic Gregorian ordinals (array "i", 0 when
+    missing) and every text field as an index into one table of distinct strings
+    (array "I"). Filled while a statement is fixed (see fix_wise_statement());
+    written with write() as CSV, or as Arrow IPC when pyarrow is installed.
+    """
+
+    STRING_FIELDS = (
+        "account", "currency", "credit_debit", "status", "acct_svcr_ref",
+        "entry_ref", "bank_tx_code", "remittance",
+    )
+    COLUMNS = (
+        "account", "booking_date", "value_date", "amount", "currency", "credit_debit",
+        "status", "acct_svcr_ref", "entry_ref", "bank_tx_code", "remittance",
+    )
+
+    def __init__(self) -> None:
+        self.amount = array("q")
+        self.booking_date = array("i")
+        self.value_date = array("i")
+        self.strings: list[str] = []
+        self._string_index: dict[str, int] = {}
+        self.text = {name: array("I") for name in self.STRING_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def _intern(self, value: str) -> int:
+        index = self._string_index.get(value)
+        if index is None:
+            index = self._string_index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def append(self, entry: Entry) -> None:
+        self.amount.append(_scaled_amount(entry.amount) if entry.amount else 0)
+        self.booking_date.append(_date_ordinal(entry.booking_date))
+        self.value_date.append(_date_ordinal(entry.value_date))
+        text = self.text
+        text["remittance"].append(self._intern(" | ".join(entry.remittance)))
+        for name in self.STRING_FIELDS[:-1]:
+            text[name].append(self._intern(getattr(entry, name)))
+
+    def rows(self) -> Iterator[tuple[str, ...]]:
+        """The entries as CSV-ready string tuples, in COLUMNS order."""
+        strings = self.strings
+        text = self.text
+        ordinal = date.fromordinal
+        for i in range(len(self)):
+            yield (
+                strings[text["account"][i]],
+                ordinal(self.booking_date[i]).isoformat() if self.booking_date[i] else "",
+                ordinal(self.value_date[i]).isoformat() if self.value_date[i] else "",
+                _format_amount(self.amount[i]),
+                *(strings[text[name][i]] for name in self.STRING_FIELDS[1:]),
+            )
+
+    def write(self, path: Path) -> None:
+        """Write as Arrow IPC for .arrow/.feather/.ipc paths, CSV otherwise."""
+        if path.suffix.lower() in (".arrow", ".feather", ".ipc"):
+            self.write_arrow(path)
+        else:
+            self.write_csv(path)
+
+    def write_csv(self, path: Path) -> None:
+        with open_output(path) as out:
+            writer = csv.writer(out, lineterminator="\n")
+            writer.writerow(self.COLUMNS)
+            writer.writerows(self.rows())
+
+    def write_arrow(self, path: Path) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.feather as feather
+        except ImportError:
+            raise RuntimeError("Arrow output needs pyarrow; write a .csv file instead") from None
+
+        epoch = date(1970, 1, 1).toordinal()
+        dictionary = pa.array(self.strings, pa.string())
+
+        def dates(values: array) -> pa.Array:
+            return pa.array([v - epoch if v else None for v in values], pa.date32())
+
+        def strings(name: str) -> pa.Array:
+            return pa.DictionaryArray.from_arrays(pa.array(self.text[name], pa.uint32()), dictionary)
+
+        table = pa.table({
+            "account": strings("account"),
+            "booking_date": dates(self.booking_date),
+            "value_date": dates(self.value_date),
+            "amount": pa.array(
+                [Decimal(v).scaleb(-AMOUNT_DECIMALS) for v in self.amount], pa.decimal128(18, AMOUNT_DECIMALS)
+            ),
+            **{name: strings(name) for name in self.STRING_FIELDS[1:]},
+        })
+        feather.write_feather(table, str(path), compression="uncompressed")
+
+def collect_columns(root: ET.Element, ns: str, columns: EntryColumns) -> None:
+    """Append every <Ntry> of a fixed document or <Stmt> to `columns`, in document order."""
+    q = tag_table(ns)
+    for stmt in root.iter(q["Stmt"]):
+        acct = find_child(stmt, q["Acct"])
+        account = account_id(acct, ns) if acct is not None else ""
+        for ntry in stmt.iterfind(q["Ntry"]):
+            columns.append(Entry.from_element(ntry, ns, account))
+
+def iter_entries(source: Path | StatementSource) -> Iterator[Entry]:
+    """
+    Yield every <Ntry> of a statement (a path or anything fix_wise_stream() reads)
+    as a fixed Entry, in document order. The input is parsed incrementally and each
+    entry's elements are dropped once its record is built, so memory is bounded by
+    the records the caller keeps.
+    """
+    chunks = read_chunks(source) if isinstance(source, Path) else source_chunks(source)
+    ctx: FixContext | None = None
+    downgrade = False
+    account = ""
+    stack: list[ET.Element] = []  # open elements outside an entry
+    in_entry = 0                  # depth inside the current <Ntry>
+    events = ("start-ns", "start", "end")
+    for event, elem in _iterparse_chunks(downgrade_namespace_declaration(chunks), events):
+        if event == "start-ns":
+            # 001.10 declared again below a root rewritten to 001.02
+            downgrade = downgrade or (ctx is not None and ctx.ns == CAMT_02 and elem[1] == CAMT_10)
+            continue
+        if event == "start":
+            if ctx is None:
+                doc_ns = detect_namespace(elem)
+                if doc_ns is None:
+                    raise ValueError("Input XML has no namespace; expected ISO 20022 camt.053.")
+                downgrade = doc_ns == CAMT_10
+                ctx = FixContext(CAMT_02 if downgrade else doc_ns)
+                q = tag_table(ctx.ns)
+                ntry_tag, acct_tag, stmt_tag = q["Ntry"], q["Acct"], q["Stmt"]
+            if downgrade:
+                _rename_element(elem, CAMT_10, CAMT_02)
+            if in_entry or elem.tag == ntry_tag:
+                in_entry += 1
+            else:
+                stack.append(elem)
+            continue
+
+        if in_entry:
+            in_entry -= 1
+            if not in_entry:
+                parent = stack[-1] if stack else None
+                apply_fixes(elem, ctx, parent=parent)
+                yield Entry.from_element(elem, ctx.ns, account)
+                if parent is not None:
+                    parent.remove(elem)
+            continue
+
+        stack.pop()
+        if elem.tag == acct_tag:
+            account = account_id(elem, ctx.ns)
+        elif elem.tag == stmt_tag and stack:
+            stack[-1].remove(elem)
+
+class ConversionCache:
+    """
+    Content-addressed on-disk cache of fixed outputs.
+
+    Entries are keyed by the SHA-256 of the input bytes, the tool version,
+    OUTPUT_FORMAT, the XML backend and the output options, so a statement that was
+    already converted is copied from the cache without being parsed. A hit refreshes
+    the entry's mtime; once the cache grows beyond `max_bytes` the least recently
+    used entries are evicted.
+
+    Entries are stored uncompressed: a .gz, .xz or .zip output is decompressed into
+    the cache and compressed again for each hit, so that the gzip header and the
+    zip member are named after the file that is written, and all compressions of
+    one conversion share an entry.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, input_path: Path, **options: object) -> str:
+        digest = hashlib.sha256()
+        for chunk in read_chunks(input_path):
+            digest.update(chunk)
+        backend = "lxml" if HAVE_LXML else "etree"
+        options = {**options, "format": OUTPUT_FORMAT, "backend": backend}
+        digest.update(f"\0{__version__}\0{json.dumps(options, sort_keys=True)}".encode())
+        return digest.hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.xml"
+
+    def get(self, key: str, output_path: Path) -> bool:
+        """Copy the cached output for `key` to `output_path`; False on a miss."""
+        entry = self._entry(key)
+        try:
+            if _compression(output_path):
+                with open(entry, encoding="utf-8", newline="") as cached, open_output(output_path) as out:
+                    shutil.copyfileobj(cached, out)
+            else:
+                shutil.copyfile(entry, output_path)
+        except FileNotFoundError:
+            return False
+        os.utime(entry)
+        return True
+
+    def put(self, key: str, output_path: Path) -> None:
+        entry = self._entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        opener = _DECOMPRESSORS.get(_compression(output_path))
+        if opener is None:
+            shutil.copyfile(output_path, tmp)
+        else:
+            with opener(output_path) as source, open(tmp, "wb") as cached:
+                shutil.copyfileobj(source, cached)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for path in self.directory.glob("??/*.xml"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:  # evicted concurrently
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+def fix_wise_statement_cached(
+    input_path: Path,
+    output_path: Path,
+    cache: ConversionCache,
+    pretty: bool = True,
+    streaming: bool = False,
+    select: StatementFilter | None = None,
+    jobs: int = 1,
+) -> FixStats | None:
+    """
+    fix_wise_statement() behind a ConversionCache. Returns None when the output
+    was served from the cache (nothing was parsed, so there are no stats). With
+    `jobs` > 1 a miss is converted by fix_wise_statement_parallel().
+    """
+    # The streaming engines write empty elements as <a />, lxml's tree engine as <a/>.
+    options: dict[str, object] = {"pretty": pretty, "streaming": streaming or jobs > 1}
+    if select is not None:
+        options.update(accounts=sorted(select.accounts), currencies=sorted(select.currencies))
+    key = cache.key(input_path, **options)
+    if cache.get(key, output_path):
+        return None
+    if jobs > 1:
+        stats = fix_wise_statement_parallel(input_path, output_path, pretty, jobs, select)
+    elif streaming:
+        stats = fix_wise_statement_streaming(input_path, output_path, pretty, select=select)
+    else:
+        stats = fix_wise_statement(input_path, output_path, pretty, select=select)
+    cache.put(key, output_path)
+    return stats
+
+def _compression(path: Path) -> str:
+    suffix = path.suffix.lower()
+    return suffix if suffix in COMPRESSED_SUFFIXES else ""
+
+def _split_name(path: Path) -> tuple[str, str]:
+    """("input", ".xml.gz") for input.xml.gz: the name without and with its suffixes."""
+    compression = path.suffix if _compression(path) in (".gz", ".xz") else ""
+    base = Path(path.name[: len(path.name) - len(compression)])
+    return base.stem, base.suffix + compression
+
+def default_output_path(input_path: Path, output_dir: Path | None = None) -> Path:
+    """
+    input.xml -> input_FIXED.xml (input.xml.gz -> input_FIXED.xml.gz), next to the
+    input or inside `output_dir`.
+    """
+    stem, suffixes = _split_name(input_path)
+    name = f"{stem}_FIXED{suffixes}"
+    return (output_dir / name) if output_dir is not None else input_path.with_name(name)
+
+# Files picked up from a directory.
+INPUT_PATTERNS = ("*.xml", "*.xml.gz", "*.xml.xz", "*.zip")
+
+def collect_inputs(specs: Iterable[str], missing: list[str] | None = None) -> list[Path]:
+    """
+    Expand files, directories (their *.xml, *.xml.gz, *.xml.xz and *.zip files) and
+    glob patterns into input paths. Previously written *_FIXED outputs are skipped.
+    Specs that are neither an existing path nor a pattern matching anything are
+    appended to `missing`.
+    """
+    found: dict[Path, None] = {}
+    for spec in specs:
+        path = Path(spec)
+        if path.is_dir():
+            candidates = sorted(p for pattern in INPUT_PATTERNS for p in path.glob(pattern))
+        elif path.exists():
+            candidates = [path]
+        else:
+            candidates = sorted(Path(p) for p in glob.glob(spec, recursive=True))
+            if not candidates and missing is not None:
+                missing.append(spec)
+        for candidate in candidates:
+            if candidate.is_file() and not _split_name(candidate)[0].endswith("_FIXED"):
+                found.setdefault(candidate, None)
+    return list(found)
+
+class BatchResult(NamedTuple):
+    input: Path
+    output: Path
+    error: str | None = None
+    stats: FixStats | None = None
+    cached: bool = False
+
+def _fix_one(
+    input_path: Path,
+    output_path: Path,
+    streaming: bool,
+    pretty: bool,
+    cache: ConversionCache | None = None,
+) -> BatchResult:
+    try:
+        if cache is not None:
+            stats = fix_wise_statement_cached(input_path, output_path, cache, pretty, streaming)
+            if stats is None:
+                return BatchResult(input_path, output_path, cached=True)
+        elif streaming:
+            stats = fix_wise_statement_streaming(input_path, output_path, pretty)
+        else:
+            stats = fix_wise_statement(input_path, output_path, pretty)
+    except Exception as e:
+        return BatchResult(input_path, output_path, f"{type(e).__name__}: {e}")
+    return BatchResult(input_path, output_path, stats=stats)
+
+def _unique_outputs(inputs: Iterable[Path], output_dir: Path | None) -> Iterator[tuple[Path, Path, str | None]]:
+    """
+    (input, output, error) for each input. Inputs of the same name from different
+    directories would share an output in `output_dir`; all but the first get an error.
+    """
+    claimed: dict[Path, Path] = {}
+    for input_path in inputs:
+        output = default_output_path(input_path, output_dir)
+        first = claimed.get(output)
+        if first is None:
+            claimed[output] = input_path
+            yield input_path, output, None
+        else:
+            yield input_path, output, f"{output} is already written for {first}"
+
+def fix_batch(
+    inputs: Iterable[Path],
+    output_dir: Path | None = None,
+    jobs: int | None = None,
+    streaming: bool = False,
+    pretty: bool = True,
+    cache: ConversionCache | None = None,
+) -> Iterator[BatchResult]:
+    """
+    Fix many statements, fanning the files out over a process pool of `jobs` workers
+    (default: one per CPU). Yields one BatchResult per input as soon as it is done;
+    a failing file does not stop the others. An input whose output name was already
+    taken by another input (see _unique_outputs()) fails without being converted.
+    """
+    tasks = []
+    for input_path, output, error in _unique_outputs(inputs, output_dir):
+        if error is not None:
+            yield BatchResult(input_path, output, error)
+        else:
+            tasks.append((input_path, output, streaming, pretty, cache))
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield _fix_one(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_fix_one, *task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+def _fixed_member_name(name: str) -> str:
+    member = PurePosixPath(name)
+    return str(member.with_name(f"{member.stem}_FIXED{member.suffix}"))
+
+def _fix_zip_member(
+    archive_path: Path, member: str, streaming: bool, pretty: bool
+) -> tuple[bytes | None, str | None, FixStats | None]:
+    """Worker side of fix_zip(): fix one member read straight from the archive."""
+    try:
+        with zipfile.ZipFile(archive_path) as archive, archive.open(member) as source:
+            dest = io.BytesIO()
+            stats = fix_wise_stream(source, dest, pretty, streaming)
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", None
+    return dest.getvalue(), None, stats
+
+def fix_zip(
+    archive_path: Path,
+    output_path: Path | None = None,
+    jobs: int | None = None,
+    streaming: bool = False,
+    pretty: bool = True,
+) -> Iterator[BatchResult]:
+    """
+    Fix every XML statement in a zip archive into a new archive of *_FIXED members
+    (default: archive_FIXED.zip next to the input). Each worker opens the archive
+    and reads its member directly; this process writes the results in archive order.
+    Nothing is extracted to disk. Yields one BatchResult per member, whose paths are
+    the archive paths joined with the member names.
+    """
+    if output_path is None:
+        output_path = default_output_path(archive_path)
+    with zipfile.ZipFile(archive_path) as archive:
+        members = [i for i in archive.infolist() if not i.is_dir() and i.filename.lower().endswith(".xml")]
+    tasks = [(archive_path, info.filename, streaming, pretty) for info in members]
+
+    with ExitStack() as stack:
+        if jobs == 1 or len(tasks) <= 1:
+            results = starmap(_fix_zip_member, tasks)
+        else:
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+            results = pool.map(_fix_zip_member, *zip(*tasks))
+        out = stack.enter_context(zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED))
+        for info, (data, error, stats) in zip(members, results):
+            name = _fixed_member_name(info.filename)
+            if error is None:
+                out.writestr(zipfile.ZipInfo(name, info.date_time), data, zipfile.ZIP_DEFLATED)
+            yield BatchResult(archive_path / info.filename, output_path / name, error, stats)
+
+def _main_batch(args: argparse.Namespace) -> int:
+    missing: list[str] = []
+    inputs = collect_inputs(args.batch, missing)
+    if not inputs and not missing:
+        print("ERROR: No input files matched.", file=sys.stderr)
+        return 2
+
+    archives = [p for p in inputs if p.suffix.lower() == ".zip"]
+    files = [p for p in inputs if p.suffix.lower() != ".zip"]
+    if args.output_dir is not None:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+
+    results: Iterable[BatchResult] = [
+        BatchResult(Path(spec), Path(spec), "No such file or no match") for spec in missing
+    ]
+    cache = _cache_from_args(args)
+    results = chain(results, fix_batch(files, args.output_dir, args.jobs, args.stream, args.pretty, cache))
+    for archive, output, error in _unique_outputs(archives, args.output_dir):
+        if error is not None:
+            results = chain(results, [BatchResult(archive, output, error)])
+        else:
+            results = chain(results, fix_zip(archive, output, args.jobs, args.stream, args.pretty))
+
+    total = failed = 0
+    for result in results:
+        total += 1
+        if result.error is None:
+            print(f"{'CACHED' if result.cached else 'OK':<7} {result.input} -> {result.output}")
+            if args.stats and result.stats is not None:
+                _print_stats(result.stats, result.input)
+        else:
+            failed += 1
+            print(f"FAILED  {result.input}: {result.error}", file=sys.stderr)
+
+    print(f"Fixed {total - failed} of {total} files.")
+    return 1 if failed else 0
+
+# --- Merging overlapping statements -------------------------------------------
+
+# Balance types carried over from the earliest statement; every other balance
+# (CLBD, CLAV, FWAV, ...) comes from the latest one.
+OPENING_BALANCE_CODES = frozenset(("OPBD", "PRCD", "OPAV"))
+
+def account_key(stmt: ET.Element, ns: str) -> tuple[str, str]:
+    """(account id, currency) of a <Stmt>; statements with the same key get merged."""
+    acct = find_child(stmt, qname(ns, "Acct"))
+    if acct is None:
+        return "", ""
+    return account_id(acct, ns), text_of(findone_ns(acct, ns, "Ccy"))
+
+def entry_key(ntry: ET.Element, ns: str) -> bytes:
+    """
+    16-byte digest identifying a fixed <Ntry> across statements: its reference
+    (AcctSvcrRef, else NtryRef) with amount, currency, direction and booking date.
+    Entries without any reference only match entries that are identical.
+    """
+    q = tag_table(ns)
+    ref = text_of(find_child(ntry, q["AcctSvcrRef"])) or text_of(find_child(ntry, q["NtryRef"]))
+    if ref:
+        amt = find_child(ntry, q["Amt"])
+        parts = (
+            ref,
+            text_of(amt),
+            amt.get("Ccy", "") if amt is not None else "",
+            text_of(find_child(ntry, q["CdtDbtInd"])),
+            _entry_date(ntry, ns),
+        )
+        data = "\0".join(parts).encode()
+    else:
+        data = ET.tostring(ntry)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def _statement_period(stmt: ET.Element, ns: str) -> str:
+    for path in ("FrToDt/FrDtTm", "CreDtTm"):
+        t = text_of(findone_ns(stmt, ns, path))
+        if t:
+            return t
+    return ""
+
+def _balance_code(bal: ET.Element, ns: str) -> str:
+    return text_of(findone_ns(bal, ns, "Tp/CdOrPrtry/Cd"))
+
+def _merge_account(stmts: list[ET.Element], ns: str) -> tuple[ET.Element, list[ET.Element]]:
+    """
+    Combine the statements of one account (in period order, without their entries)
+    into the start of one <Stmt>; returns it and the children that go after the
+    entries. The header comes from the latest statement, the period and opening
+    balances from the earliest; <TxsSummry> is dropped because its totals no longer
+    add up.
+    """
+    q = tag_table(ns)
+    first, last = stmts[0], stmts[-1]
+
+    balances = [b for b in first.findall(q["Bal"]) if _balance_code(b, ns) in OPENING_BALANCE_CODES]
+    balances += [b for b in last.findall(q["Bal"]) if _balance_code(b, ns) not in OPENING_BALANCE_CODES]
+
+    merged = ET.Element(last.tag, last.attrib)
+    trailer = []
+    for child in list(last):  # appending moves an lxml element out of `last`
+        name = localname(child.tag)
+        if name == "TxsSummry":
+            continue
+        if name == "AddtlStmtInf":
+            trailer.append(child)
+        elif name == "Bal":
+            merged.extend(balances)
+            balances = []
+        elif name == "FrToDt":
+            period = deepcopy(child)
+            start = findone_ns(first, ns, "FrToDt/FrDtTm")
+            if start is not None:
+                ensure_child(period, ns, "FrDtTm").text = start.text
+            merged.append(period)
+        else:
+            merged.append(child)
+    merged.extend(balances)
+    return merged, trailer
+
+class _MergePart(NamedTuple):
+    """One input <Stmt> of merge_statements(), as kept by its first pass."""
+
+    source: Path
+    number: int            # position among the statements of `source`
+    stmt: ET.Element       # with its fixed children except the entries
+    kept: bytearray        # per <Ntry>: 1 if it is written, 0 if it is a duplicate
+
+def _iter_fixed_parts(
+    path: Path,
+    stats: FixStats,
+    prefixes: list[tuple[str, str]],
+    wanted: Callable[[int], bool] | None = None,
+) -> Iterator[tuple[str, ET.Element, int]]:
+    """
+    Parse and fix `path` incrementally, as (event, element, level) in XmlWriter
+    terms: "start" and "end" for the document element, <BkToCstmrStmt> and every
+    <Stmt> (levels 0-2), "element" for each of their other children once it has
+    been fixed and detached. The first "start" element carries the document
+    namespace. The children of the statements (numbered from 0) that `wanted`
+    rejects are dropped without being fixed; namespace declarations are appended
+    to `prefixes`.
+    """
+    clock = time.perf_counter
+    ctx: FixContext | None = None
+    downgrade = False
+    stack: list[ET.Element] = []  # <Document>, <BkToCstmrStmt>, <Stmt>
+    number = -1                   # of the current statement
+    skip = False                  # whether its children are dropped
+    depth = 0                     # > 0 inside a child of <BkToCstmrStmt> or <Stmt>
+
+    chunks = downgrade_namespace_declaration(read_chunks(path))
+    for event, item in _iterparse_chunks(chunks, ("start-ns", "start", "end")):
+        if event == "start-ns":
+            prefixes.append(item)
+            # 001.10 declared again below a root rewritten to 001.02
+            downgrade = downgrade or (ctx is not None and ctx.ns == CAMT_02 and item[1] == CAMT_10)
+            continue
+
+        elem = item
+        if event == "start":
+            if ctx is None:
+                ns = detect_namespace(elem)
+                if ns is None:
+                    raise ValueError("Input XML has no namespace; expected ISO 20022 camt.053.")
+                downgrade = ns == CAMT_10
+                ctx = FixContext(CAMT_02 if downgrade else ns, stats)
+            if depth:
+                depth += 1
+            elif len(stack) < 2 or (len(stack) == 2 and localname(elem.tag) == "Stmt"):
+                if len(stack) == 2:
+                    number += 1
+                    skip = wanted is not None and not wanted(number)
+                stack.append(elem)
+            else:
+                depth = 1
+            if downgrade and not skip:
+                _rename_element(elem, CAMT_10, CAMT_02)
+            if not depth:
+                yield "start", elem, len(stack) - 1
+            continue
+
+        # event == "end"
+        if depth > 1:
+            depth -= 1
+            if downgrade and not skip:
+                _rename_element(elem, CAMT_10, CAMT_02)
+            continue
+        parent = stack[-1]
+        if depth:
+            depth = 0
+            if skip:
+                elem.clear()
+                parent.remove(elem)
+                continue
+            t0 = clock()
+            keep = apply_fixes(elem, ctx, parent=parent)
+            stats.add_time("fix", clock() - t0)
+            parent.remove(elem)
+            if keep:
+                yield "element", elem, len(stack)
+            continue
+
+        stack.pop()
+        handler = FIX_HANDLERS.get(localname(elem.tag))
+        if handler is not None:
+            ctx.parent = stack[-1] if stack else None
+            handler(elem, ctx)
+        yield "end", elem, len(stack)
+        if len(stack) == 2:
+            stack[-1].remove(elem)
+            skip = False
+
+    if ctx is None or not ctx.seen_bk_to_cstmr_stmt:
         raise ValueError("Could not find BkToCstmrStmt; not a camt.053 statement?")
 
-    # Apply fixes per statement
-    for stmt in root.findall(f".//{qname(ns,'Stmt')}"):
-        remove_total_entries(stmt, ns)
+def _kept_entries(parts: list[_MergePart], ns: str) -> Iterator[ET.Element]:
+    """
+    The second pass of merge_statements(): the kept <Ntry> elements of `parts`,
+    parsed and fixed again, in order. Consecutive parts that come from one input
+    in document order are read in one go; the input is left as soon as the last
+    of them has been read.
+    """
+    stats = FixStats()  # already counted by the first pass
+    ntry_tag = qname(ns, "Ntry")
+    runs: list[list[_MergePart]] = []
+    for part in parts:
+        if runs and runs[-1][-1].source == part.source and runs[-1][-1].number < part.number:
+            runs[-1].append(part)
+        else:
+            runs.append([part])
+
+    for run in runs:
+        kept = {part.number: part.kept for part in run}
+        last = run[-1].number
+        number = -1
+        flags: Iterator[int] = iter(())
+        for event, elem, level in _iter_fixed_parts(run[0].source, stats, [], kept.__contains__):
+            if level == 3:
+                if elem.tag == ntry_tag and next(flags):
+                    yield elem
+            elif level == 2 and event == "start":
+                number += 1
+                flags = iter(kept.get(number, b""))
+            elif level == 2 and event == "end" and number == last:
+                break
 
-        # For each entry
-        for ntry in stmt.findall(f".//{qname(ns,'Ntry')}"):
-            normalize_status(ntry, ns)
-            ensure_acct_svcr_ref(ntry, ns)
-            move_addtl_info_into_tx(ntry, ns)
+def merge_statements(input_paths: Iterable[Path], output_path: Path, pretty: bool = True) -> FixStats:
+    """
+    Fix several (possibly overlapping) statements and write them as one document
+    with a single <Stmt> per account and currency, dropping entries that already
+    appeared in an earlier input (see entry_key()).
 
-    normalize_dates(root, ns)
+    Two passes over the inputs, each parsing incrementally: the first fixes every
+    statement and keeps its header and balances, a 16-byte digest per entry for the
+    duplicate index and a byte per entry saying whether it is written. The second
+    reads the statements again, in period order per account, and writes the kept
+    entries as they are fixed (an input holding several accounts is read once per
+    account). Memory grows with the number of entries by those few bytes, not with
+    their size; the output is only created once the first pass has succeeded.
+    """
+    clock = time.perf_counter
+    started = clock()
+    stats = FixStats(stages={"parse": 0.0, "fix": 0.0, "merge": 0.0, "write": 0.0})
+    doc_ns = ""
+    prefixes: list[tuple[str, str]] = []
+    envelope: list[ET.Element] = []   # <Document>, <BkToCstmrStmt> of the first input
+    header: list[ET.Element] = []     # their other children before the statements
+    trailer: list[ET.Element] = []    # ... and after them
+    accounts: dict[tuple[str, str], list[_MergePart]] = {}
+    seen: dict[tuple[str, str], set[bytes]] = {}
 
-    # Pretty output
-    indent(root)
+    for path in input_paths:
+        first = not envelope
+        stmt: ET.Element | None = None
+        number = -1
+        for event, elem, level in _iter_fixed_parts(path, stats, prefixes):
+            if event == "start":
+                if level == 0:
+                    ns = detect_namespace(elem)
+                    if first:
+                        doc_ns = ns
+                    elif ns != doc_ns:
+                        raise ValueError(f"{path}: namespace {ns} differs from {doc_ns}; can't merge")
+                    ntry_tag = qname(ns, "Ntry")
+                if level < 2:
+                    if first:
+                        envelope.append(elem)
+                else:
+                    stmt, number, key, kept = elem, number + 1, None, bytearray()
+            elif event == "end":
+                if level == 2:
+                    key = key or account_key(stmt, doc_ns)
+                    accounts.setdefault(key, []).append(_MergePart(path, number, stmt, kept))
+                    stmt = None
+            elif level == 2:
+                if first:
+                    (header if number < 0 else trailer).append(elem)
+            elif elem.tag != ntry_tag:
+                stmt.append(elem)
+            else:
+                t0 = clock()
+                if key is None:
+                    key = account_key(stmt, doc_ns)
+                    keys = seen.setdefault(key, set())
+                digest = entry_key(elem, doc_ns)
+                if digest in keys:
+                    kept.append(0)
+                    stats.duplicates_removed += 1
+                else:
+                    kept.append(1)
+                    keys.add(digest)
+                stats.add_time("merge", clock() - t0)
 
-    # Ensure the output uses the correct default namespace
-    ET.register_namespace("", ns)
+    if not envelope:
+        raise ValueError("No input statements to merge.")
+    stages = stats.stages
+    stages["parse"] = max(0.0, clock() - started - stages["fix"] - stages["merge"])
 
-    tree.write(str(output_path), encoding="utf-8", xml_declaration=True)
+    # Keep the first document's envelope and group header.
+    with stats.timed("write"), open_output(output_path) as out:
+        writer = XmlWriter(out.write, doc_ns, pretty)
+        for prefix, uri in prefixes:
+            writer.hint_prefix(prefix, uri)
+        writer.declaration()
+        for level, elem in enumerate(envelope):
+            writer.start(elem, level)
+        for elem in header:
+            writer.element(elem, 2)
+        for parts in accounts.values():
+            parts.sort(key=lambda part: _statement_period(part.stmt, doc_ns))
+            merged, stmt_trailer = _merge_account([part.stmt for part in parts], doc_ns)
+            writer.start(merged, 2)
+            for elem in chain(merged, _kept_entries(parts, doc_ns), stmt_trailer):
+                writer.element(elem, 3)
+            writer.end(merged, 2)
+        for elem in trailer:
+            writer.element(elem, 2)
+        for level in reversed(range(len(envelope))):
+            writer.end(envelope[level], level)
+        writer.finish()
+    return stats
+
+def _main_merge(args: argparse.Namespace) -> int:
+    missing: list[str] = []
+    inputs = collect_inputs(args.merge, missing)
+    if missing:
+        # Most likely the output file given after the inputs; that one goes to -o.
+        names = ", ".join(missing)
+        print(f"ERROR: Input file not found: {names} (the output goes to -o/--output)", file=sys.stderr)
+        return 2
+    if not inputs:
+        print("ERROR: No input files matched.", file=sys.stderr)
+        return 2
+    out_path = args.output or inputs[0].with_name("merged_FIXED.xml")
+    try:
+        stats = merge_statements(inputs, out_path, args.pretty)
+    except Exception as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    print(f"Merged {len(inputs)} files ({stats.duplicates_removed} duplicate entries dropped) into: {out_path}")
+    if args.stats:
+        _print_stats(stats, inputs[0])
+    return 0
+
+# --- Splitting by account ----------------------------------------------------
+
+# Text handed to a split output's writer thread at a time.
+SPLIT_BUFFER_SIZE = 1 << 16
+
+def split_output_path(input_path: Path, account: str, currency: str, output_dir: Path | None = None) -> Path:
+    """input.xml -> input_<account>_<currency>_FIXED.xml, like default_output_path()."""
+    stem, suffixes = _split_name(input_path)
+    label = "_".join(re.sub(r"[^\w.-]+", "", part) or "unknown" for part in (account, currency))
+    name = f"{stem}_{label}_FIXED{suffixes}"
+    return (output_dir / name) if output_dir is not None else input_path.with_name(name)
+
+def _split_group_header(grp_hdr: ET.Element, ns: str, number: int) -> ET.Element:
+    """The <GrpHdr> of the `number`th split output: a MsgId of its own and no pagination."""
+    hdr = deepcopy(grp_hdr)
+    msg_id = find_child(hdr, qname(ns, "MsgId"))
+    if msg_id is not None:
+        suffix = f"-{number}"
+        msg_id.text = text_of(msg_id)[: 35 - len(suffix)] + suffix  # MsgId is Max35Text
+    pagination = find_child(hdr, qname(ns, "MsgPgntn"))
+    if pagination is not None:
+        hdr.remove(pagination)
+    return hdr
+
+class _SplitOutput:
+    """
+    One file of split_statement(). The parsing thread serializes into a buffer;
+    a thread of its own encodes, compresses and writes the buffered text, so the
+    outputs are written concurrently with each other and with parsing.
+    """
+
+    def __init__(self, path: Path, ns: str, pretty: bool) -> None:
+        self.path = path
+        self._buffer = io.StringIO()
+        self.writer = XmlWriter(self._buffer.write, ns, pretty)
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=16)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name=f"split {path.name}", daemon=True)
+        self._thread.start()
+
+    def flush(self, size: int = SPLIT_BUFFER_SIZE) -> None:
+        """Hand the buffered text to the writer thread if there are at least `size` characters."""
+        buffer = self._buffer
+        pending = buffer.tell()
+        if pending and pending >= size:
+            self._queue.put(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+
+    def close(self) -> None:
+        """Write what is buffered, wait for the writer thread and raise its error, if any."""
+        self.flush(0)
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        try:
+            with open_output(self.path) as out:
+                while (text := self._queue.get()) is not None:
+                    out.write(text)
+        except BaseException as e:
+            self._error = e
+            # Keep draining so that the parsing thread never blocks on a full queue.
+            while self._queue.get() is not None:
+                pass
+
+class SplitResult(NamedTuple):
+    outputs: dict[tuple[str, str], Path]  # (account, currency) -> file
+    stats: FixStats
+
+def split_statement(
+    input_path: Path,
+    output_dir: Path | None = None,
+    pretty: bool = True,
+    select: StatementFilter | None = None,
+) -> SplitResult:
+    """
+    Fix a statement and write the <Stmt> blocks of each account and currency
+    (Acct/Id/IBAN, or Acct/Id/Othr/Id, and Acct/Ccy) to a file of their own, named
+    by split_output_path(). Every file gets the document envelope and a copy of
+    <GrpHdr> with its own MsgId (see _split_group_header()).
+
+    The input is read once, with iterparse: each child of a <Stmt> is fixed as
+    soon as it has been parsed, then serialized and handed to its output's writer
+    thread, so memory stays flat as with fix_wise_statement_streaming(). A
+    statement is held back until its <Acct> has been read; statements that
+    `select` rejects are skipped without being fixed. All outputs are removed
+    again if the input turns out to be invalid.
+    """
+    started = time.perf_counter()
+    stats = FixStats(stages={"parse": 0.0, "fix": 0.0, "write": 0.0})
+    clock = time.perf_counter
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    outputs: dict[tuple[str, str], _SplitOutput] = {}
+    prefix_hints: list[tuple[str, str]] = []
+
+    ctx: FixContext | None = None
+    downgrade = False
+    stack: list[ET.Element] = []      # <Document>, <BkToCstmrStmt>, <Stmt>
+    envelope: list[ET.Element] = []   # <Document>, <BkToCstmrStmt>
+    header: list[ET.Element] = []     # fixed children of <BkToCstmrStmt> before the statements
+    trailer: list[ET.Element] = []    # ... and after them
+    out: _SplitOutput | None = None   # output of the current statement, once its <Acct> was read
+    held: list[ET.Element] = []       # children of the current statement until then
+    skip = False                      # whether the current statement is dropped
+    depth = 0                         # > 0 inside a child of <BkToCstmrStmt> or <Stmt>
+
+    def output_for(key: tuple[str, str]) -> _SplitOutput:
+        output = outputs.get(key)
+        if output is None:
+            output = outputs[key] = _SplitOutput(split_output_path(input_path, *key, output_dir), ctx.ns, pretty)
+            writer = output.writer
+            for prefix, uri in prefix_hints:
+                writer.hint_prefix(prefix, uri)
+            writer.declaration()
+            writer.start(envelope[0], 0)
+            writer.start(envelope[1], 1)
+            for elem in header:
+                if localname(elem.tag) == "GrpHdr":
+                    elem = _split_group_header(elem, ctx.ns, len(outputs))
+                writer.element(elem, 2)
+        return output
+
+    def start_statement(stmt: ET.Element, key: tuple[str, str]) -> _SplitOutput | None:
+        if select is not None and not select.matches(*key):
+            stats.statements_skipped += 1
+            return None
+        output = output_for(key)
+        output.writer.start(stmt, 2)
+        for elem in held:
+            output.writer.element(elem, 3)
+        return output
+
+    chunks = downgrade_namespace_declaration(read_chunks(input_path))
+    try:
+        for event, item in _iterparse_chunks(chunks, ("start-ns", "start", "end")):
+            if event == "start-ns":
+                prefix_hints.append(item)
+                for output in outputs.values():
+                    output.writer.hint_prefix(*item)
+                # 001.10 declared again below a root rewritten to 001.02
+                downgrade = downgrade or (ctx is not None and ctx.ns == CAMT_02 and item[1] == CAMT_10)
+                continue
+
+            elem = item
+            if event == "start":
+                if ctx is None:
+                    ns = detect_namespace(elem)
+                    if ns is None:
+                        raise ValueError("Input XML has no namespace; expected ISO 20022 camt.053.")
+                    downgrade = ns == CAMT_10
+                    ctx = FixContext(CAMT_02 if downgrade else ns, stats)
+                if depth:
+                    depth += 1
+                    continue
+                if len(stack) < 2:
+                    stack.append(elem)
+                    envelope.append(elem)
+                elif len(stack) == 2 and localname(elem.tag) == "Stmt":
+                    stack.append(elem)
+                    out, held, skip = None, [], False
+                else:
+                    depth = 1
+                if downgrade and not skip:
+                    _rename_element(elem, CAMT_10, CAMT_02)
+                continue
+
+            # event == "end"
+            if depth > 1:
+                depth -= 1
+                if downgrade and not skip:
+                    _rename_element(elem, CAMT_10, CAMT_02)
+                continue
+            parent = stack[-1]
+            if depth:
+                depth = 0
+                if skip:
+                    elem.clear()
+                    parent.remove(elem)
+                    continue
+                t0 = clock()
+                keep = apply_fixes(elem, ctx, parent=parent)
+                t1 = clock()
+                stats.stages["fix"] += t1 - t0
+                parent.remove(elem)
+                if not keep:
+                    continue
+                if len(stack) == 2:
+                    (trailer if outputs or stats.statements_skipped else header).append(elem)
+                elif out is not None:
+                    out.writer.element(elem, 3)
+                    out.flush()
+                else:
+                    held.append(elem)
+                    if localname(elem.tag) == "Acct":
+                        ccy = findone_ns(elem, ctx.ns, "Ccy")
+                        out = start_statement(parent, (account_id(elem, ctx.ns), text_of(ccy)))
+                        skip, held = out is None, []
+                stats.stages["write"] += clock() - t1
+                continue
+
+            stack.pop()
+            handler = FIX_HANDLERS.get(localname(elem.tag))
+            if handler is not None:
+                ctx.parent = stack[-1] if stack else None
+                handler(elem, ctx)
+            if len(stack) == 2:
+                # The end of a statement
+                if out is None and not skip:
+                    out = start_statement(elem, ("", ""))  # no <Acct>
+                if out is not None:
+                    out.writer.end(elem, 2)
+                stack[-1].remove(elem)
+                out, held, skip = None, [], False
+
+        if ctx is None or not ctx.seen_bk_to_cstmr_stmt:
+            raise ValueError("Could not find BkToCstmrStmt; not a camt.053 statement?")
+        t0 = clock()
+        for output in outputs.values():
+            writer = output.writer
+            for elem in trailer:
+                writer.element(elem, 2)
+            writer.end(envelope[1], 1)
+            writer.end(envelope[0], 0)
+            writer.finish()
+    except BaseException:
+        for output in outputs.values():
+            try:
+                output.close()
+            except Exception:
+                pass
+            output.path.unlink(missing_ok=True)
+        raise
+
+    errors = []
+    for output in outputs.values():
+        try:
+            output.close()
+        except Exception as e:
+            errors.append(e)
+    stats.stages["write"] += clock() - t0
+    if errors:
+        for output in outputs.values():
+            output.path.unlink(missing_ok=True)
+        raise errors[0]
+    stages = stats.stages
+    stages["parse"] = max(0.0, clock() - started - stages["fix"] - stages["write"])
+    return SplitResult({key: output.path for key, output in outputs.items()}, stats)
+
+def _main_split(args: argparse.Namespace) -> int:
+    try:
+        result = split_statement(args.input, args.output_dir, args.pretty, _select_from_args(args))
+    except Exception as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    for (account, currency), path in result.outputs.items():
+        print(f"{account or '-'} {currency or '-'}: {path}")
+    print(f"Split into {len(result.outputs)} files.")
+    if args.stats:
+        _print_stats(result.stats, args.input)
+    return 0
+
+# --- Watch-folder daemon -------------------------------------------------------
+
+DEFAULT_DEBOUNCE = 2.0
+INDEX_FILE_NAME = ".fix_wise_index.jsonl"
+
+class ProcessedIndex:
+    """
+    Which input files were already converted, as (size, mtime_ns) per file name.
+
+    Stored as JSON lines that are only ever appended to (the last line for a name
+    wins), so recording a conversion costs O(1). Superseded lines are dropped when
+    the index is loaded.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._entries: dict[str, tuple[int, int]] = {}
+        lines = 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                        self._entries[record["name"]] = (record["size"], record["mtime_ns"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn last line after a crash
+        except FileNotFoundError:
+            pass
+        if lines > len(self._entries):
+            self._compact()
+
+    def is_current(self, name: str, st: os.stat_result) -> bool:
+        return self._entries.get(name) == (st.st_size, st.st_mtime_ns)
+
+    def record(self, name: str, st: os.stat_result) -> None:
+        self._entries[name] = (st.st_size, st.st_mtime_ns)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(self._line(name) + "\n")
+
+    def _line(self, name: str) -> str:
+        size, mtime_ns = self._entries[name]
+        return json.dumps({"name": name, "size": size, "mtime_ns": mtime_ns})
+
+    def _compact(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for name in self._entries:
+                f.write(self._line(name) + "\n")
+        os.replace(tmp, self.path)
+
+class _InotifyWatcher:
+    """Names of files written or moved into a directory, from Linux inotify via ctypes."""
+
+    _IN_MODIFY = 0x002
+    _IN_CLOSE_WRITE = 0x008
+    _IN_MOVED_TO = 0x080
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory: Path) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self._IN_MODIFY | self._IN_CLOSE_WRITE | self._IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def read(self, timeout: float) -> list[str]:
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+class _PollingWatcher:
+    """Fallback for systems without inotify: rescan the directory every `interval` seconds."""
+
+    def __init__(self, directory: Path, interval: float) -> None:
+        self._directory = directory
+        self._interval = interval
+        self._seen = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        with os.scandir(self._directory) as entries:
+            return {e.name: (e.stat().st_size, e.stat().st_mtime_ns) for e in entries if e.is_file()}
+
+    def read(self, timeout: float) -> list[str]:
+        time.sleep(min(timeout, self._interval))
+        current = self._scan()
+        changed = [name for name, sig in current.items() if self._seen.get(name) != sig]
+        self._seen = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+def is_input_name(name: str) -> bool:
+    """Whether collect_inputs() would pick up a file of this name from a directory."""
+    return any(fnmatch.fnmatch(name, p) for p in INPUT_PATTERNS) and not _split_name(Path(name))[0].endswith("_FIXED")
+
+class FolderWatcher:
+    """
+    Convert statements as they land in `directory`.
+
+    Files are picked up from inotify events (or by polling where inotify isn't
+    available) and converted once their size and mtime have not changed for
+    `debounce` seconds, so partially uploaded files are left alone. Conversions are
+    recorded in a ProcessedIndex; on start, files that are new or changed since
+    then are converted too, and later files are handled one event at a time.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        output_dir: Path | None = None,
+        debounce: float = DEFAULT_DEBOUNCE,
+        streaming: bool = False,
+        pretty: bool = True,
+        cache: ConversionCache | None = None,
+        jobs: int | None = None,
+        poll_interval: float = DEFAULT_DEBOUNCE,
+    ) -> None:
+        self.directory = directory
+        self.output_dir = output_dir
+        self.debounce = debounce
+        self.streaming = streaming
+        self.pretty = pretty
+        self.cache = cache
+        self.jobs = jobs
+        self.poll_interval = poll_interval
+        self.index = ProcessedIndex((output_dir or directory) / INDEX_FILE_NAME)
+        # name -> (size, mtime_ns) when last seen, and when it may be converted
+        self._pending: dict[str, tuple[tuple[int, int], float]] = {}
+
+    def run(self, report: Callable[[BatchResult], object] = lambda result: None) -> None:
+        """Watch until interrupted, passing every conversion result to `report`."""
+        if self.output_dir is not None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            watcher = _InotifyWatcher(self.directory)
+        except (OSError, AttributeError):
+            watcher = _PollingWatcher(self.directory, self.poll_interval)
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    self._touch(entry.name)
+            while True:
+                for result in self._convert_due():
+                    report(result)
+                timeout = self._next_timeout()
+                for name in watcher.read(timeout):
+                    self._touch(name)
+        finally:
+            watcher.close()
+
+    def _touch(self, name: str) -> None:
+        if not is_input_name(name):
+            return
+        try:
+            st = (self.directory / name).stat()
+        except FileNotFoundError:
+            self._pending.pop(name, None)
+            return
+        if self.index.is_current(name, st):
+            return
+        self._pending[name] = ((st.st_size, st.st_mtime_ns), time.monotonic() + self.debounce)
+
+    def _next_timeout(self) -> float:
+        if not self._pending:
+            return 3600.0
+        return max(0.0, min(due for _, due in self._pending.values()) - time.monotonic())
+
+    def _convert_due(self) -> Iterator[BatchResult]:
+        now = time.monotonic()
+        for name, (signature, due) in list(self._pending.items()):
+            if due > now:
+                continue
+            path = self.directory / name
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                del self._pending[name]
+                continue
+            if (st.st_size, st.st_mtime_ns) != signature:
+                # Still being written: wait for another quiet period.
+                self._pending[name] = ((st.st_size, st.st_mtime_ns), now + self.debounce)
+                continue
+            del self._pending[name]
+            output = default_output_path(path, self.output_dir)
+            if path.suffix.lower() == ".zip":
+                yield from fix_zip(path, output, self.jobs, self.streaming, self.pretty)
+            else:
+                yield _fix_one(path, output, self.streaming, self.pretty, self.cache)
+            self.index.record(name, st)
+
+def _main_watch(args: argparse.Namespace) -> int:
+    if not args.watch.is_dir():
+        print(f"ERROR: Not a directory: {args.watch}", file=sys.stderr)
+        return 2
+
+    def report(result: BatchResult) -> None:
+        if result.error is None:
+            print(f"{'CACHED' if result.cached else 'OK':<7} {result.input} -> {result.output}", flush=True)
+            if args.stats and result.stats is not None:
+                _print_stats(result.stats, result.input)
+        else:
+            print(f"FAILED  {result.input}: {result.error}", file=sys.stderr, flush=True)
+
+    watcher = FolderWatcher(
+        args.watch,
+        args.output_dir,
+        debounce=args.debounce,
+        streaming=args.stream,
+        pretty=args.pretty,
+        cache=_cache_from_args(args),
+        jobs=args.jobs,
+        poll_interval=args.debounce,
+    )
+    try:
+        watcher.run(report)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# --- HTTP conversion service -------------------------------------------------
+
+DEFAULT_MAX_BODY = 200 * 1024 * 1024
+
+# Seconds a client may take to send the request head, and each read of the body.
+DEFAULT_READ_TIMEOUT = 30.0
+
+MAX_HEADER_FIELDS = 100
+
+# The request body is read in pieces of this size.
+BODY_READ_SIZE = 1 << 16
+
+_HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    411: "Length Required",
+    413: "Payload Too Large",
+    414: "URI Too Long",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str, body_read: bool = True) -> None:
+        super().__init__(message)
+        self.status = status
+        self.body_read = body_read  # False if the request body is still unread
+
+class ConversionServer:
+    """
+    Minimal HTTP/1.1 server (stdlib asyncio) that fixes uploaded statements.
+
+      POST /fix[?pretty=0]   body: statement XML   -> fixed XML
+      GET  /health                                 -> "ok"
+
+    Conversions run in a process pool. At most `max_concurrency` requests have
+    their body read or converted at once, further requests wait for a free slot
+    before their body is read, so that at most that many bodies are buffered.
+    Request heads are limited in line length (the stream limit, 64 KiB), number of
+    header fields and time (`read_timeout`, which also applies to each read of the
+    body).
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        max_concurrency: int | None = None,
+        max_body: int = DEFAULT_MAX_BODY,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+    ) -> None:
+        self._workers = workers or os.cpu_count() or 1
+        self._max_concurrency = max_concurrency or 2 * self._workers
+        self._max_body = max_body
+        self._read_timeout = read_timeout
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    async def serve_forever(self, host: str, port: int) -> None:
+        self._slots = asyncio.Semaphore(self._max_concurrency)
+        with ProcessPoolExecutor(max_workers=self._workers) as pool:
+            self._pool = pool
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            addrs = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+            print(f"Serving on {addrs} ({self._workers} workers)", file=sys.stderr)
+            async with server:
+                await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                keep_alive = await self._handle_request(reader, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), self._read_timeout)
+        except asyncio.TimeoutError:
+            return False  # an idle connection
+        except (ValueError, asyncio.LimitOverrunError):
+            await self._respond(writer, 414, b"Request line too long", keep_alive=False)
+            return False
+        if not request_line:
+            return False
+        try:
+            headers = await asyncio.wait_for(self._read_headers(reader), self._read_timeout)
+        except asyncio.TimeoutError:
+            await self._respond(writer, 408, b"Timed out reading the request head", keep_alive=False)
+            return False
+        except _HttpError as e:
+            await self._respond(writer, e.status, str(e).encode(), keep_alive=False)
+            return False
+
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            await self._respond(writer, 400, b"Malformed request line", keep_alive=False)
+            return False
+        keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+        try:
+            status, body, content_type = 200, *await self._dispatch(method, target, headers, reader)
+        except _HttpError as e:
+            status, body, content_type = e.status, str(e).encode(), "text/plain; charset=utf-8"
+            # If the request body wasn't read, the connection can't be reused.
+            keep_alive = keep_alive and e.body_read
+        await self._respond(writer, status, body, content_type, keep_alive)
+        return keep_alive
+
+    async def _read_headers(self, reader: asyncio.StreamReader) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        count = 0
+        while True:
+            try:
+                line = await reader.readline()
+            except (ValueError, asyncio.LimitOverrunError):
+                raise _HttpError(431, "Header line too long", body_read=False) from None
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            count += 1
+            if count > MAX_HEADER_FIELDS:
+                raise _HttpError(431, f"More than {MAX_HEADER_FIELDS} header fields", body_read=False)
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def _read_body(self, reader: asyncio.StreamReader, length: int) -> bytes:
+        parts = []
+        while length:
+            size = min(length, BODY_READ_SIZE)
+            try:
+                parts.append(await asyncio.wait_for(reader.readexactly(size), self._read_timeout))
+            except asyncio.TimeoutError:
+                raise _HttpError(408, "Timed out reading the request body", body_read=False) from None
+            length -= size
+        return b"".join(parts)
+
+    async def _dispatch(
+        self,
+        method: str,
+        target: str,
+        headers: dict[str, str],
+        reader: asyncio.StreamReader,
+    ) -> tuple[bytes, str]:
+        path, _, query = target.partition("?")
+        if path == "/health":
+            return b"ok", "text/plain; charset=utf-8"
+        if path != "/fix":
+            raise _HttpError(404, f"Unknown path: {path}", body_read="content-length" not in headers)
+        if method != "POST":
+            raise _HttpError(405, "Use POST /fix with the statement XML as the body", body_read=False)
+        if "content-length" not in headers:
+            raise _HttpError(411, "Content-Length is required", body_read=False)
+        value = headers["content-length"]
+        if not value.isascii() or not value.isdigit():
+            raise _HttpError(400, f"Invalid Content-Length: {value!r}", body_read=False)
+        length = int(value)
+        if length > self._max_body:
+            raise _HttpError(413, f"Statement larger than {self._max_body} bytes", body_read=False)
+
+        pretty = "pretty=0" not in query.split("&")
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            data = await self._read_body(reader, length)
+            fixed, status, error = await loop.run_in_executor(self._pool, _fix_upload, data, pretty)
+        if fixed is None:
+            raise _HttpError(status, error)
+        return fixed, "application/xml"
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes,
+        content_type: str = "text/plain; charset=utf-8",
+        keep_alive: bool = True,
+    ) -> None:
+        head = (
+            f"HTTP/1.1 {status} {_HTTP_REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+def _fix_upload(data: bytes, pretty: bool) -> tuple[bytes | None, int, str]:
+    """
+    Worker side of ConversionServer: the fixed statement, or None with an HTTP status
+    and message. Errors are returned as text because some don't pickle (lxml's
+    XMLSyntaxError holds its error log).
+    """
+    try:
+        return fix_wise_bytes(data, pretty), 200, ""
+    except (ValueError, ET.ParseError) as e:
+        return None, 400, f"ERROR: {e}"
+    except Exception as e:
+        return None, 500, f"ERROR: {type(e).__name__}: {e}"
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8053,
+    workers: int | None = None,
+    max_concurrency: int | None = None,
+) -> None:
+    """Run the HTTP conversion service until interrupted."""
+    asyncio.run(ConversionServer(workers, max_concurrency).serve_forever(host, port))
+
+def _parse_listen_address(value: str) -> tuple[str, int]:
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def _cache_from_args(args: argparse.Namespace) -> ConversionCache | None:
+    if args.cache_dir is None:
+        return None
+    return ConversionCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+
+def _select_from_args(args: argparse.Namespace) -> StatementFilter | None:
+    if not (args.accounts or args.currencies):
+        return None
+    return StatementFilter(frozenset(args.accounts or ()), frozenset(args.currencies or ()))
+
+def _print_stats(stats: FixStats, input_path: Path) -> None:
+    """One JSON object per converted file on stderr, for metrics collection."""
+    record = {"input": str(input_path), **asdict(stats)}
+    print(json.dumps(record, sort_keys=True), file=sys.stderr)
 
 def main() -> int:
     parser = argparse.ArgumentParser(description="Fix Wise camt.053 statements for strict importers.")
-    parser.add_argument("input", type=Path, help="Input Wise XML file")
+    parser.add_argument("input", type=Path, nargs="?", help="Input Wise XML file")
     parser.add_argument("output", type=Path, nargs="?", default=None, help="Output fixed XML file")
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="output_file",
+        type=Path,
+        default=None,
+        help="Output file, for a single input (instead of the positional OUTPUT) or --merge",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Fix entries while reading the input, keeping memory flat (for very large statements)",
+    )
+    parser.add_argument(
+        "--no-pretty",
+        dest="pretty",
+        action="store_false",
+        help="Write compact XML without indentation",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print per-stage timings and fix counters as JSON (one line per file) on stderr",
+    )
+    parser.add_argument(
+        "--account",
+        dest="accounts",
+        action="append",
+        metavar="IBAN",
+        help="Keep only the statements of this account (repeatable); others are dropped unfixed",
+    )
+    parser.add_argument(
+        "--currency",
+        dest="currencies",
+        action="append",
+        metavar="CCY",
+        help="Keep only the statements in this account currency (repeatable)",
+    )
+    parser.add_argument(
+        "--columns",
+        metavar="PATH",
+        type=Path,
+        default=None,
+        help="Also export the fixed entries as columns: CSV, or Arrow IPC for .arrow/.feather "
+        "(needs pyarrow)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Reuse earlier conversions of identical inputs stored in this directory",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+        help="Evict least recently used cache entries beyond this size (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--batch",
+        nargs="+",
+        metavar="PATH",
+        help="Fix many files: input files, directories (*.xml inside) or glob patterns",
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        metavar="PATH",
+        help="Merge overlapping statements into one file (OUTPUT defaults to merged_FIXED.xml "
+        "next to the first input), with one <Stmt> per account and duplicate entries dropped",
+    )
+    parser.add_argument(
+        "--split",
+        action="store_true",
+        help="Write one file per account and currency (input_<IBAN>_<CCY>_FIXED.xml, or in --output-dir)",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        type=Path,
+        help="Keep running and convert statements as they arrive in DIR (outputs: --output-dir)",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEFAULT_DEBOUNCE,
+        help="With --watch, wait until a file has not changed for this many seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=_positive_int,
+        default=None,
+        help="Worker processes for --batch and --serve (default: number of CPUs); for a single "
+        "file, fix its entries in this many processes",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=None,
+        help="Write --batch, --split and --watch outputs here instead of next to each input",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="[HOST:]PORT",
+        type=_parse_listen_address,
+        help="Run an HTTP service converting statements POSTed to /fix (workers: --jobs)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=_positive_int,
+        default=None,
+        help="Uploads buffered or converted at once for --serve (default: twice the workers)",
+    )
     args = parser.parse_args()
 
+    if (args.columns is not None or args.accounts or args.currencies) and (
+        args.serve or args.watch or args.batch or args.merge
+    ):
+        parser.error("--columns, --account and --currency only work when fixing a single file")
+    if args.output_file is not None:
+        if args.serve or args.watch or args.batch or args.split:
+            parser.error("-o/--output only works for a single file or --merge")
+        if args.output is not None or (args.merge and args.input is not None):
+            parser.error("give the output file either with -o/--output or as a positional argument")
+    if args.columns is not None and args.split:
+        parser.error("--columns can't be combined with --split")
+    parallel = args.jobs is not None and args.jobs > 1 and not (args.serve or args.watch or args.batch)
+    if parallel and (args.columns is not None or args.merge or args.split):
+        parser.error("-j/--jobs doesn't apply to --columns, --merge or --split")
+    if args.serve:
+        try:
+            serve(*args.serve, workers=args.jobs, max_concurrency=args.max_concurrency)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.watch:
+        if args.input is not None:
+            parser.error("--watch converts the files in its directory; don't pass a positional input")
+        return _main_watch(args)
+    if args.batch:
+        if args.input is not None:
+            parser.error("--batch takes its inputs as arguments; don't pass a positional input")
+        return _main_batch(args)
+    if args.merge:
+        if args.output is not None:
+            parser.error("--merge takes its inputs as arguments; pass at most the output file")
+        # The only positional argument, if any, is where the merged statement goes.
+        args.output = args.output_file or args.input
+        return _main_merge(args)
+    if args.input is None:
+        parser.error("an input file (or --batch) is required")
+    if args.split:
+        if args.output is not None:
+            parser.error("--split names its outputs itself; use --output-dir to place them")
+        return _main_split(args)
+
     in_path: Path = args.input
     if not in_path.exists():
         print(f"ERROR: Input file not found: {in_path}", file=sys.stderr)
         return 2
 
     out_path: Path
-    if args.output is None:
-        out_path = in_path.with_name(in_path.stem + "_FIXED" + in_path.suffix)
+    if args.output_file is not None:
+        out_path = args.output_file
+    elif args.output is None:
+        out_path = default_output_path(in_path)
     else:
         out_path = args.output
 
+    # A cache hit skips the fix pass that fills the columns.
+    columns = EntryColumns() if args.columns is not None else None
+    cache = _cache_from_args(args) if columns is None else None
+    select = _select_from_args(args)
     try:
-        fix_wise_statement(in_path, out_path)
+        if cache is not None:
+            stats = fix_wise_statement_cached(
+                in_path, out_path, cache, args.pretty, args.stream, select, args.jobs if parallel else 1
+            )
+        elif parallel:
+            stats = fix_wise_statement_parallel(in_path, out_path, args.pretty, args.jobs, select)
+        elif args.stream:
+            stats = fix_wise_statement_streaming(in_path, out_path, args.pretty, columns, select)
+        else:
+            stats = fix_wise_statement(in_path, out_path, args.pretty, columns, select)
+        if columns is not None:
+            columns.write(args.columns)
     except Exception as e:
         print(f"ERROR: {e}", file=sys.stderr)
         return 1
 
-    print(f"Fixed file written to: {out_path}")
+    print(f"Fixed file written to: {out_path}" + (" (from cache)" if stats is None else ""))
+    if columns is not None:
+        print(f"{len(columns)} entries written to: {args.columns}")
+    if args.stats and stats is not None:
+        _print_stats(stats, in_path)
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,394 @@
+"""
+Regression checks for fix_wise_camt053: the engines must agree on odd inputs.
+
+Run with `python -m pytest tests/`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import importlib.util
+import os
+import pickle
+import re
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fix_wise_camt053 as fixer  # noqa: E402
+
+CAMT_10 = fixer.CAMT_10
+
+def _entry(amount: str, name: str = "Alice", ref: str | None = None) -> str:
+    ntry_ref = f"<NtryRef>{ref}</NtryRef>" if ref else ""
+    return (
+        f"<Ntry>{ntry_ref}<Amt Ccy=\"EUR\">{amount}</Amt><CdtDbtInd>DBIT</CdtDbtInd>"
+        "<Sts><Cd>BOOK</Cd></Sts><BookgDt><DtTm>2025-01-02T10:00:00</DtTm></BookgDt>"
+        "<NtryDtls><TxDtls><RltdPties><Cdtr><Pty><Nm>"
+        f"{name}</Nm></Pty></Cdtr></RltdPties></TxDtls></NtryDtls>"
+        "<AddtlNtryInf>Card transaction</AddtlNtryInf></Ntry>"
+    )
+
+def _document(*stmts: str) -> str:
+    return (
+        f"<?xml version='1.0' encoding='UTF-8'?>\n<Document xmlns=\"{CAMT_10}\"><BkToCstmrStmt>"
+        "<GrpHdr><MsgId>M</MsgId><CreDtTm>2025-01-03T00:00:00</CreDtTm></GrpHdr>"
+        + "".join(stmts)
+        + "</BkToCstmrStmt></Document>\n"
+    )
+
+def _write(tmp_path: Path, text: str, name: str = "in.xml") -> Path:
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+def test_split_statement_without_acct(tmp_path):
+    source = _write(tmp_path, _document(f"<Stmt><Id>1</Id>{_entry('1.00')}</Stmt>"))
+    result = fixer.split_statement(source, tmp_path / "out")
+
+    assert list(result.outputs) == [("", "")]
+    streamed = tmp_path / "streamed.xml"
+    fixer.fix_wise_statement_streaming(source, streamed)
+    split = result.outputs[("", "")].read_text(encoding="utf-8")
+    assert "<Stmt>" in split and "AcctSvcrRef" in split
+    # Same statement as the streaming engine (the group header gets a MsgId suffix).
+    assert split.replace("<MsgId>M-1</MsgId>", "<MsgId>M</MsgId>") == streamed.read_text(encoding="utf-8")
+
+def test_synthetic_ref_includes_counterparty(tmp_path):
+    # camt.053.001.10 nests the name in <Pty>; both payments must get distinct digests.
+    source = _write(tmp_path, _document(f"<Stmt><Id>1</Id>{_entry('1.00', 'Alice')}{_entry('1.00', 'Bob')}</Stmt>"))
+    root = fixer.ET.fromstring(fixer.fix_wise_bytes(source.read_bytes()))
+    refs = [fixer.text_of(r) for r in root.iter(fixer.qname(fixer.CAMT_02, "AcctSvcrRef"))]
+
+    assert len(refs) == 2 and refs[0] != refs[1]
+    assert all(r.startswith(fixer.SYNTHETIC_REF_PREFIX) and r.count("-") == 1 for r in refs)
+
+def test_cache_key_covers_output_format(tmp_path, monkeypatch):
+    source = _write(tmp_path, _document(f"<Stmt><Id>1</Id>{_entry('1.00')}</Stmt>"))
+    cache = fixer.ConversionCache(tmp_path / "cache")
+    key = cache.key(source, pretty=True)
+    monkeypatch.setattr(fixer, "HAVE_LXML", not fixer.HAVE_LXML)
+    other_backend = cache.key(source, pretty=True)
+    monkeypatch.setattr(fixer, "OUTPUT_FORMAT", fixer.OUTPUT_FORMAT + 1)
+    assert len({key, other_backend, cache.key(source, pretty=True)}) == 3
+
+def test_cache_hit_names_compressed_output_after_its_file(tmp_path):
+    source = _write(tmp_path, _document(f"<Stmt><Id>1</Id>{_entry('1.00')}</Stmt>"))
+    cache = fixer.ConversionCache(tmp_path / "cache")
+    first, second = tmp_path / "first_FIXED.zip", tmp_path / "second_FIXED.zip"
+    assert fixer.fix_wise_statement_cached(source, first, cache) is not None
+    assert fixer.fix_wise_statement_cached(source, second, cache) is None
+
+    with zipfile.ZipFile(first) as a, zipfile.ZipFile(second) as b:
+        assert b.namelist() == ["second_FIXED.xml"]
+        fixed = a.read("first_FIXED.xml")
+        assert b.read("second_FIXED.xml") == fixed
+    gz = tmp_path / "third_FIXED.xml.gz"
+    assert fixer.fix_wise_statement_cached(source, gz, cache) is None
+    assert gzip.decompress(gz.read_bytes()) == fixed
+    assert gz.read_bytes()[10:].startswith(b"third_FIXED.xml\0")  # FNAME of the gzip header
+
+def test_malformed_upload_is_a_picklable_400():
+    result = pickle.loads(pickle.dumps(fixer._fix_upload(b"<Document><oops", True)))
+    assert result[:2] == (None, 400)
+
+def test_remove_total_entries_on_stdlib_elements():
+    from xml.etree import ElementTree
+
+    ns = fixer.CAMT_02
+    stmt = ElementTree.fromstring(f'<Stmt xmlns="{ns}"><TxsSummry><TtlNtries /></TxsSummry><Id>1</Id></Stmt>')
+    fixer.remove_total_entries(stmt, ns)
+    assert stmt.find(f".//{{{ns}}}TtlNtries") is None
+
+    ntry = ElementTree.fromstring(f'<Ntry xmlns="{ns}"><ValDt><DtTm>2025-01-02T10:00:00</DtTm></ValDt></Ntry>')
+    fixer.normalize_dates(ntry, ns)
+    assert ntry.findtext(f"{{{ns}}}ValDt/{{{ns}}}Dt") == "2025-01-02"
+
+def test_entry_fixes_on_stdlib_elements_with_lxml_loaded():
+    from xml.etree import ElementTree
+
+    module = _load_backend("lxml")
+    ns = fixer.CAMT_02
+    text = _entry("1.00").replace("<Ntry>", f'<Ntry xmlns="{ns}">')
+    fixed = []
+    for parse in (ElementTree.fromstring, module.ET.fromstring):
+        ntry = parse(text)
+        module.fix_entry(ntry, ns, seen_refs={})
+        assert module.normalize_date_container(module.find_child(ntry, f"{{{ns}}}BookgDt"), ns)
+        fixed.append(module.Entry.from_element(ntry, ns))
+    assert fixed[0] == fixed[1]
+    assert fixed[0].status == "BOOK" and fixed[0].booking_date == "2025-01-02"
+    assert fixed[0].acct_svcr_ref.startswith(fixer.SYNTHETIC_REF_PREFIX)
+    assert fixed[0].remittance == ("Card transaction",)
+
+def test_entry_record_is_slotted(tmp_path):
+    source = _write(tmp_path, _document(f"<Stmt><Id>1</Id>{_entry('1.00')}</Stmt>"))
+    entry = next(fixer.iter_entries(source))
+    assert not hasattr(entry, "__dict__")
+    assert entry == fixer.Entry.from_element(entry.to_element(), fixer.CAMT_02)
+    assert repr(entry).startswith("Entry(amount='1.00', currency='EUR'")
+
+def test_batch_reports_missing_inputs_and_output_collisions(tmp_path):
+    for directory in ("a", "b"):
+        (tmp_path / directory).mkdir()
+        _write(tmp_path / directory, _document(f"<Stmt><Id>1</Id>{_entry('1.00')}</Stmt>"), "s.xml")
+    missing: list[str] = []
+    specs = [str(tmp_path / "a"), str(tmp_path / "b"), str(tmp_path / "typo.xml")]
+    inputs = fixer.collect_inputs(specs, missing)
+    assert missing == [str(tmp_path / "typo.xml")]
+
+    results = list(fixer.fix_batch(inputs, tmp_path / "out", jobs=1))
+    assert [r.error is None for r in results] == [False, True]
+    assert results[0].input == tmp_path / "b" / "s.xml"
+
+def _http_status(request: bytes, **options) -> bytes:
+    """Status line the conversion server answers `request` with."""
+    async def exchange() -> bytes:
+        server = fixer.ConversionServer(workers=1, **options)
+        server._slots = asyncio.Semaphore(1)  # as serve_forever() does; no pool is started
+        listener = await asyncio.start_server(server._handle_connection, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            status = await asyncio.wait_for(reader.readline(), 5)
+            writer.close()
+        return status
+
+    return asyncio.run(exchange())
+
+def test_server_rejects_invalid_content_length():
+    for value in ("abc", "-5", "1e3"):
+        request = f"POST /fix HTTP/1.1\r\nContent-Length: {value}\r\n\r\n<x/>".encode()
+        assert _http_status(request).startswith(b"HTTP/1.1 400 ")
+
+def test_server_limits_request_heads():
+    long_line = b"X-Padding: " + b"x" * (1 << 17) + b"\r\n"
+    assert _http_status(b"POST /fix HTTP/1.1\r\n" + long_line + b"\r\n").startswith(b"HTTP/1.1 431 ")
+    assert _http_status(b"GET /" + b"x" * (1 << 17) + b" HTTP/1.1\r\n\r\n").startswith(b"HTTP/1.1 414 ")
+    many = b"".join(b"X-%d: 1\r\n" % i for i in range(fixer.MAX_HEADER_FIELDS + 1))
+    assert _http_status(b"GET /health HTTP/1.1\r\n" + many + b"\r\n").startswith(b"HTTP/1.1 431 ")
+    # Head and body that never arrive in full
+    assert _http_status(b"GET /health HTTP/1.1\r\n", read_timeout=0.1).startswith(b"HTTP/1.1 408 ")
+    partial = b"POST /fix HTTP/1.1\r\nContent-Length: 10\r\n\r\n<x/>"
+    assert _http_status(partial, read_timeout=0.1).startswith(b"HTTP/1.1 408 ")
+
+def test_merge_output_after_inputs_is_an_error(tmp_path, monkeypatch, capsys):
+    source = _write(tmp_path, _document(f"<Stmt><Id>1</Id>{_entry('1.00')}</Stmt>"))
+    target = tmp_path / "merged.xml"
+    monkeypatch.setattr(sys, "argv", ["fix_wise_camt053.py", "--merge", str(source), str(target)])
+    assert fixer.main() == 2
+    assert not target.exists() and not (tmp_path / "merged_FIXED.xml").exists()
+
+    monkeypatch.setattr(sys, "argv", ["fix_wise_camt053.py", "--merge", str(source), "-o", str(target)])
+    assert fixer.main() == 0 and target.exists()
+
+def test_worker_counts_must_be_positive(tmp_path, monkeypatch, capsys):
+    source = _write(tmp_path, _document(f"<Stmt><Id>1</Id>{_entry('1.00')}</Stmt>"))
+    for option in (["-j", "0"], ["--jobs", "-2"], ["--batch", str(source), "-j", "0"], ["--max-concurrency", "0"]):
+        monkeypatch.setattr(sys, "argv", ["fix_wise_camt053.py", str(source), *option])
+        with pytest.raises(SystemExit) as exc:
+            fixer.main()
+        assert exc.value.code == 2
+        assert "must be at least 1" in capsys.readouterr().err
+    assert not (tmp_path / "in_FIXED.xml").exists()
+
+def _period_statement(start: str, end: str, opening: str, closing: str, *entries: str) -> str:
+    balances = "".join(
+        f"<Bal><Tp><CdOrPrtry><Cd>{code}</Cd></CdOrPrtry></Tp><Amt Ccy=\"EUR\">{amount}</Amt>"
+        "<CdtDbtInd>CRDT</CdtDbtInd></Bal>"
+        for code, amount in (("OPBD", opening), ("CLBD", closing))
+    )
+    return (
+        f"<Stmt><Id>{start}</Id><FrToDt><FrDtTm>{start}T00:00:00</FrDtTm><ToDtTm>{end}T23:59:59</ToDtTm>"
+        "</FrToDt><Acct><Id><IBAN>GB11TEST0001</IBAN></Id><Ccy>EUR</Ccy></Acct>"
+        f"{balances}<TxsSummry><TtlNtries><NbOfNtries>3</NbOfNtries></TtlNtries></TxsSummry>"
+        + "".join(entries)
+        + "</Stmt>"
+    )
+
+def test_merge_drops_overlap_and_spans_balances(tmp_path):
+    early = _period_statement("2025-01-01", "2025-06-30", "10.00", "20.00",
+                              _entry("1.00", ref="a"), _entry("2.00", ref="b"), _entry("3.00", "Bob"))
+    late = _period_statement("2025-04-01", "2025-12-31", "15.00", "40.00",
+                             _entry("2.00", ref="b"), _entry("3.00", "Bob"), _entry("4.00", ref="c"))
+    inputs = [_write(tmp_path, _document(late), "late.xml"), _write(tmp_path, _document(early), "early.xml")]
+    target = tmp_path / "merged.xml"
+    stats = fixer.merge_statements(inputs, target)
+
+    # The entries of the earlier input were duplicates; the statements still go in period order.
+    assert stats.duplicates_removed == 2
+    ns = {"c": fixer.CAMT_02}
+    (stmt,) = fixer.ET.parse(str(target)).getroot().findall("c:BkToCstmrStmt/c:Stmt", ns)
+    assert [amt.text for amt in stmt.findall("c:Ntry/c:Amt", ns)] == ["1.00", "2.00", "3.00", "4.00"]
+    balances = [(bal.findtext("c:Tp/c:CdOrPrtry/c:Cd", namespaces=ns), bal.findtext("c:Amt", namespaces=ns))
+                for bal in stmt.findall("c:Bal", ns)]
+    assert balances == [("OPBD", "10.00"), ("CLBD", "40.00")]
+    assert stmt.findtext("c:FrToDt/c:FrDtTm", namespaces=ns) == "2025-01-01T00:00:00"
+    assert stmt.findtext("c:FrToDt/c:ToDtTm", namespaces=ns) == "2025-12-31T23:59:59"
+    assert stmt.find("c:TxsSummry", ns) is None
+
+# --- The engines agree ---------------------------------------------------------
+
+def _load_backend(name: str):
+    """fix_wise_camt053 imported with the given XML backend, as a module of its own."""
+    if name == "lxml":
+        pytest.importorskip("lxml")
+        module = fixer if fixer.HAVE_LXML else None
+    else:
+        module = fixer if not fixer.HAVE_LXML else None
+    if module is not None:
+        return module
+    # Registered in sys.modules so that process pool workers can unpickle its functions.
+    module_name = f"fix_wise_camt053_{name}"
+    if module_name not in sys.modules:
+        previous = os.environ.get("FIX_WISE_XML_BACKEND")
+        os.environ["FIX_WISE_XML_BACKEND"] = name
+        try:
+            spec = importlib.util.spec_from_file_location(module_name, fixer.__file__)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+        finally:
+            if previous is None:
+                del os.environ["FIX_WISE_XML_BACKEND"]
+            else:
+                os.environ["FIX_WISE_XML_BACKEND"] = previous
+    return sys.modules[module_name]
+
+def _statement(ccy: str, entries: str, iban: str | None = "GB11 TEST 0001") -> str:
+    acct = f"<Acct><Id><IBAN>{iban}</IBAN></Id><Ccy>{ccy}</Ccy></Acct>" if iban else ""
+    balance = (
+        '<Bal><Tp><CdOrPrtry><Cd>CLBD</Cd></CdOrPrtry></Tp><Amt Ccy="EUR">1.00</Amt>'
+        "<CdtDbtInd>CRDT</CdtDbtInd><Dt><DtTm>2025-01-03T00:00:00</DtTm></Dt></Bal>"
+    )
+    return (
+        f"<Stmt><Id>{ccy}</Id>{acct}{balance}<TxsSummry><TtlNtries><NbOfNtries>1</NbOfNtries>"
+        f"</TtlNtries></TxsSummry>{entries}<AddtlStmtInf>end</AddtlStmtInf></Stmt>"
+    )
+
+_REPEATED = _entry("1.00") * 7 + _entry("2.00", "Bob", ref="R1") + _entry("1.00") * 3
+
+def _prefixed(text: str) -> str:
+    """The same document with every camt element written as c:Name."""
+    text = re.sub(r"<(/?)(?=[A-Za-z])", r"<\1c:", text)
+    return text.replace(' xmlns="', ' xmlns:c="')
+
+ODD_INPUTS = {
+    "two-accounts": _document(_statement("EUR", _REPEATED), _statement("USD", _REPEATED, "GB22 TEST 0002")),
+    "no-acct": _document(_statement("EUR", _REPEATED, iban=None), _statement("USD", _entry("3.00"))),
+    "prefixed": _prefixed(_document(_statement("EUR", _REPEATED))),
+    "extension-ns": _document(
+        _statement(
+            "EUR",
+            _entry("1.00").replace(
+                "</Ntry>",
+                '<SplmtryData><Envlp><w:Extra xmlns:w="urn:wise:ext">x</w:Extra></Envlp></SplmtryData></Ntry>',
+            )
+            * 5,
+        )
+    ),
+    # camt.053.001.10 declared again below the root, whose declaration is rewritten before parsing
+    "redeclared-bk": _document(_statement("EUR", _REPEATED)).replace(
+        "<BkToCstmrStmt>", f'<BkToCstmrStmt xmlns="{CAMT_10}">'
+    ),
+    "redeclared-stmt": _document(
+        _statement("EUR", _REPEATED), _statement("USD", _REPEATED).replace("<Stmt>", f'<Stmt xmlns="{CAMT_10}">')
+    ),
+}
+
+def _outputs(module, source: Path, tmp_path: Path, pretty: bool = True) -> dict[str, str]:
+    """Output of every engine on `source`; split outputs keyed by account and currency."""
+    results = {}
+    for engine, run in (
+        ("tree", lambda out: module.fix_wise_statement(source, out, pretty)),
+        ("stream", lambda out: module.fix_wise_statement_streaming(source, out, pretty)),
+        ("parallel", lambda out: module.fix_wise_statement_parallel(source, out, jobs=2, pretty=pretty)),
+    ):
+        out = tmp_path / f"{engine}.xml"
+        run(out)
+        results[engine] = out.read_text(encoding="utf-8")
+    split = module.split_statement(source, tmp_path / "split", pretty)
+    for key, path in split.outputs.items():
+        results[("split", *key)] = path.read_text(encoding="utf-8")
+    return results
+
+@pytest.mark.parametrize("name", sorted(ODD_INPUTS))
+@pytest.mark.parametrize("backend", ["lxml", "etree"])
+def test_engines_agree(name, backend, tmp_path, monkeypatch):
+    module = _load_backend(backend)
+    # Tiny shards, so that repeated entries and their reference suffixes span several.
+    monkeypatch.setattr(module, "SHARD_ENTRIES", 2)
+    source = _write(tmp_path, ODD_INPUTS[name])
+    results = _outputs(module, source, tmp_path)
+
+    stream = results["stream"]
+    assert results["parallel"] == stream
+    # lxml's tree engine writes empty elements as <a/>, the streaming engine as <a />.
+    assert results["tree"].replace(" />", "/>") == stream.replace(" />", "/>")
+    assert "TtlNtries" not in stream and f"{fixer.SYNTHETIC_REF_PREFIX}" in stream
+    assert CAMT_10 not in stream
+
+    splits = {k[1:]: text for k, text in results.items() if k[0] == "split"}
+    assert splits
+    for (account, currency), text in splits.items():
+        select = module.StatementFilter(frozenset([account]), frozenset([currency]))
+        expected = tmp_path / "selected.xml"
+        module.fix_wise_statement_streaming(source, expected, select=select)
+        # Each split output has its own MsgId; otherwise it is the selected statement.
+        assert re.sub(r"<((?:\w+:)?MsgId)>M-\d+<", r"<\1>M<", text) == expected.read_text(encoding="utf-8")
+
+@pytest.mark.parametrize("name", sorted(ODD_INPUTS))
+def test_compact_engines_agree(name, tmp_path, monkeypatch):
+    source = _write(tmp_path, ODD_INPUTS[name])
+    streams = []
+    for backend in ("lxml", "etree"):
+        module = _load_backend(backend)
+        monkeypatch.setattr(module, "SHARD_ENTRIES", 2)
+        (tmp_path / backend).mkdir()
+        results = _outputs(module, source, tmp_path / backend, pretty=False)
+        stream = results["stream"]
+        streams.append(stream)
+        # The declaration and the document on one line each; no line break before </Document>.
+        assert stream.count("\n") == 2 and stream.endswith("</Document>\n")
+        for engine, text in results.items():
+            assert text.count("\n") == 2 and text.endswith("</Document>\n"), engine
+        assert results["parallel"] == stream
+        assert results["tree"].replace(" />", "/>") == stream.replace(" />", "/>")
+    assert streams[0] == streams[1]
+
+def _infoset(text: str) -> list[tuple]:
+    """Tags, attributes and text of every element: what is left when declarations move."""
+    root = fixer.ET.fromstring(text.encode("utf-8"))
+    return [(e.tag, dict(e.attrib), (e.text or "").strip(), (e.tail or "").strip()) for e in root.iter()]
+
+@pytest.mark.parametrize("backend", ["lxml", "etree"])
+def test_namespace_declared_on_entry(backend, tmp_path, monkeypatch):
+    module = _load_backend(backend)
+    monkeypatch.setattr(module, "SHARD_ENTRIES", 2)
+    entry = _entry("1.00").replace("<Ntry>", '<Ntry xmlns:w="urn:wise:ext">').replace(
+        "</Ntry>", "<SplmtryData><Envlp><w:Extra>x</w:Extra></Envlp></SplmtryData></Ntry>"
+    )
+    source = _write(tmp_path, _document(_statement("EUR", entry * 3)))
+    results = _outputs(module, source, tmp_path)
+
+    # lxml's tree engine keeps the declaration on <Ntry>, XmlWriter declares it where it is used.
+    expected = _infoset(results["stream"])
+    assert "{urn:wise:ext}Extra" in {item[0] for item in expected}
+    for engine in ("tree", "parallel"):
+        assert _infoset(results[engine]) == expected
+
+@pytest.mark.parametrize("name", sorted(ODD_INPUTS))
+def test_backends_agree(name, tmp_path):
+    source = _write(tmp_path, ODD_INPUTS[name])
+    outputs = []
+    for backend in ("lxml", "etree"):
+        out = tmp_path / f"{backend}.xml"
+        _load_backend(backend).fix_wise_statement_streaming(source, out)
+        outputs.append(out.read_text(encoding="utf-8"))
+    assert outputs[0] == outputs[1]